@@ -0,0 +1,41 @@
+import argparse
+import os
+
+import analyzer
+import dataset_cache
+import dataset_store
+import plot_generator
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description="Executa a análise e gera todos os gráficos num único processo, "
+                    "sem regravar e reler o DataFrame processado")
+    parser.add_argument("--input", default=os.path.join(script_dir, "datasets"),
+                        help="Pasta com os CSVs (padrão: datasets/)")
+    parser.add_argument("--results", default=os.path.join(script_dir, "results"),
+                        help="Pasta dos resultados (padrão: results/)")
+    parser.add_argument("--charts", default=os.path.join(script_dir, "..", "docs", "charts"),
+                        help="Pasta dos gráficos (padrão: ../docs/charts/)")
+    parser.add_argument("--no-save", action="store_true",
+                        help="Não grava os resultados em results/, só gera os gráficos")
+    args = parser.parse_args()
+
+    df, correlations, descriptive_stats = analyzer.run_analysis(
+        args.input, dataset_store.DEFAULT_STORE_DIR, dataset_cache.DEFAULT_CACHE_DIR)
+
+    if not args.no_save:
+        print("\n💾 Salvando resultados...")
+        analyzer.save_results(df, correlations, descriptive_stats, args.results)
+
+    # O DataFrame e os dicionários de resultados passam direto para os gráficos
+    analyzer.generate_rq_charts(df, correlations, args.charts)
+    plot_generator.generate_charts(df, correlations, descriptive_stats, args.charts)
+    analyzer.print_summary(correlations, descriptive_stats)
+
+    print("\n✅ Análise e gráficos concluídos!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,142 @@
+import argparse
 import os
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from scipy import stats
 import json
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+import dataset_cache
+import dataset_store
+import pr_database
+import streaming_stats
+
+
+# Colunas do dataset usadas em prepare_data
+ANALYSIS_COLUMNS = ['additions', 'deletions', 'hoursOpen', 'bodyLength',
+                    'merged', 'interactionsCount', 'reviewsCount']
+
+# Esquema do DataFrame combinado: inteiros estreitos para as contagens, bool
+# para merged, datas em UTC e categorias para os textos repetidos
+DATASET_DTYPES = {
+    'number': 'int32',
+    'reviewsCount': 'int16',
+    'hoursOpen': 'float64',
+    'merged': 'bool',
+    'additions': 'int32',
+    'deletions': 'int32',
+    'changedFiles': 'int32',
+    'bodyLength': 'int32',
+    'issueCommentsCount': 'int16',
+    'reviewThreadsCount': 'int16',
+    'interactionsCount': 'int16',
+    'firstResponseHours': 'float64'
+}
+DATETIME_COLUMNS = ['createdAt', 'closedOrMergedAt']
+STRING_COLUMNS = ['title', 'nodeId', 'reviewers']
+CATEGORY_COLUMNS = ['repository', 'author', 'finalReviewState']
+
+# DataFrame processado entregue ao plot_generator (em results/)
+PROCESSED_DATA_FILE = 'processed_data.parquet'
+
+
+def apply_schema(df, categories=True):
+    """Converte as colunas de `df` para DATASET_DTYPES (com `categories=False`, sem as categorias, para concatenar depois)"""
+    for column, dtype in DATASET_DTYPES.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == 'bool':
+            if not pd.api.types.is_bool_dtype(values):
+                # Texto "True"/"False" como gravado pelo coletor
+                values = values.map({'True': True, 'False': False, True: True, False: False})
+            df[column] = values.astype('boolean' if values.isna().any() else 'bool')
+            continue
+        values = pd.to_numeric(values)
+        if dtype.startswith('int'):
+            limits = np.iinfo(dtype)
+            if values.isna().any():
+                dtype = 'float64'
+            elif len(values) and (values.min() < limits.min or values.max() > limits.max):
+                dtype = 'int64'
+        df[column] = values.astype(dtype)
+
+    for column in DATETIME_COLUMNS:
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], utc=True, format='ISO8601')
+
+    for column in STRING_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('string')
+
+    if categories:
+        for column in CATEGORY_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+    return df
+
 
-def load_all_datasets(input_folder):
-    """Carrega todos os CSVs e agrega em um único DataFrame"""
-    csv_files = glob(os.path.join(input_folder, '*.csv'))
-    all_data = []
+def memory_report(df):
+    """Memória ocupada por coluna do DataFrame, em MB (incluindo o conteúdo dos textos)"""
+    return df.memory_usage(deep=True, index=False) / 2 ** 20
 
-    for csv_file in csv_files:
-        try:
-            df = pd.read_csv(csv_file)
-            df['repository'] = os.path.basename(csv_file).replace('.csv', '')
-            all_data.append(df)
-        except Exception as e:
-            print(f"Erro ao ler {csv_file}: {e}")
 
-    combined_df = pd.concat(all_data, ignore_index=True)
-    return combined_df
+def _read_repository_csv(csv_file, columns):
+    """Lê o CSV de um repositório como tabela Arrow, com a coluna `repository`"""
+    repository = os.path.basename(csv_file).replace('.csv', '')
+    try:
+        table = dataset_store.read_csv_table(csv_file, columns)
+    except Exception as e:
+        print(f"Erro ao ler {csv_file}: {e}")
+        return None
+    return table.append_column('repository', pa.array([repository] * table.num_rows, pa.string()))
+
+
+def load_all_datasets(input_folder, columns=None, repositories=None, store_folder=None, workers=None,
+                      cache_folder=None):
+    """Carrega os PRs dos CSVs de `input_folder` e das partições de `store_folder` sem CSV em um único DataFrame"""
+    if columns is not None:
+        columns = [column for column in columns if column != 'repository']
+    csv_files = sorted(glob(os.path.join(input_folder, '*.csv')))
+    csv_repositories = {os.path.basename(csv_file).replace('.csv', ''): csv_file for csv_file in csv_files}
+    selected_csv_files = [csv_file for repository, csv_file in csv_repositories.items()
+                          if repositories is None or repository in repositories]
+
+    # Repositórios coletados com --format parquet só existem no dataset Parquet
+    parquet_repositories = []
+    if store_folder is not None:
+        parquet_repositories = [repository for repository in dataset_store.list_partitions(store_folder)
+                                if repository not in csv_repositories
+                                and (repositories is None or repository in repositories)]
+
+    frames = []
+    if cache_folder is not None and selected_csv_files:
+        table = dataset_cache.load_combined(csv_files, cache_folder, workers)
+        if repositories is not None:
+            table = table.filter(pc.is_in(table['repository'], pa.array(list(repositories))))
+        if columns is not None:
+            table = table.select(columns + ['repository'])
+        frames.append(table.to_pandas())
+    elif selected_csv_files:
+        # O parser CSV do pyarrow libera o GIL, então threads bastam para usar todos os núcleos
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            tables = [table for table in executor.map(
+                lambda csv_file: _read_repository_csv(csv_file, columns), selected_csv_files)
+                if table is not None]
+        frames.append(pa.concat_tables(tables).to_pandas())
+
+    if parquet_repositories:
+        frames.append(dataset_store.load_dataset(store_folder, columns, parquet_repositories))
+
+    if not frames:
+        raise FileNotFoundError(f"Nenhum CSV em {input_folder} nem partição Parquet em {store_folder}")
+    combined_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return apply_schema(combined_df)
 
 
 def calculate_pr_size(row):
@@ -173,15 +287,111 @@ def calculate_descriptive_stats(df):
     return stats_results
 
 
-def main():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    input_folder = os.path.join(script_dir, 'datasets')
-    results_folder = os.path.join(script_dir, 'results')
-    os.makedirs(results_folder, exist_ok=True)
+# Métricas de prepare_data como expressões SQL sobre a tabela `prs` (pr_database.py)
+METRIC_EXPRESSIONS = {
+    'pr_size': 'COALESCE(additions, 0) + COALESCE(deletions, 0)',
+    'analysis_time_hours': 'COALESCE(hoursOpen, 0)',
+    'description_length': 'COALESCE(bodyLength, 0)',
+    'interactions': 'COALESCE(interactionsCount, 0)',
+    'num_reviews': 'COALESCE(reviewsCount, 0)'
+}
+
+
+def calculate_descriptive_stats_sql(database, repositories=None):
+    """Calcula as estatísticas de calculate_descriptive_stats com consultas no pr_database.PRDatabase `database`"""
+    where, params = '', []
+    if repositories is not None:
+        where = f" WHERE repository IN ({', '.join('?' * len(repositories))})"
+        params = list(repositories)
+
+    stats_results = {}
+    for metric, expression in METRIC_EXPRESSIONS.items():
+        aggregates = (f"median({expression}), AVG({expression}), stdev({expression}), "
+                      f"MIN({expression}), MAX({expression}), COUNT({expression})")
+        by_status = {merged: row for merged, *row in database.query(
+            f"SELECT COALESCE(merged, 0), {aggregates} FROM prs{where} GROUP BY 1", params)}
+        overall = database.query(f"SELECT {aggregates} FROM prs{where}", params)[0]
+
+        def summary(row):
+            median, mean, std, minimum, maximum, count = row or (None, None, None, None, None, 0)
+            return {'median': median, 'mean': mean, 'std': std,
+                    'min': minimum, 'max': maximum, 'count': count}
+
+        stats_results[metric] = {
+            'merged': summary(by_status.get(1)),
+            'not_merged': summary(by_status.get(0)),
+            'overall': summary(overall)
+        }
+
+    return stats_results
+
+
+def calculate_descriptive_stats_streaming(input_folder, relative_accuracy=streaming_stats.DEFAULT_RELATIVE_ACCURACY,
+                                          block_size=streaming_stats.DEFAULT_BLOCK_SIZE, workers=None):
+    """Calcula as estatísticas de calculate_descriptive_stats lendo os CSVs em lotes (mediana com erro relativo de até `relative_accuracy`)"""
+    def column(batch, name):
+        return pc.fill_null(batch.column(name), 0).to_numpy().astype(np.float64)
+
+    def update(stats, csv_file, batch):
+        merged = pc.fill_null(batch.column('merged'), False).to_numpy(zero_copy_only=False)
+        metrics = {
+            'pr_size': column(batch, 'additions') + column(batch, 'deletions'),
+            'analysis_time_hours': column(batch, 'hoursOpen'),
+            'description_length': column(batch, 'bodyLength'),
+            'interactions': column(batch, 'interactionsCount'),
+            'num_reviews': column(batch, 'reviewsCount')
+        }
+        for metric, values in metrics.items():
+            stats.update('merged', metric, values[merged])
+            stats.update('not_merged', metric, values[~merged])
+
+    csv_files = sorted(glob(os.path.join(input_folder, '*.csv')))
+    stats = streaming_stats.StreamingStats(relative_accuracy)
+    for partial in streaming_stats.collect(csv_files, update, relative_accuracy,
+                                           block_size=block_size, workers=workers):
+        stats.merge(partial)
+
+    def summary(state):
+        result = state.result()
+        return {'median': result['median'], 'mean': result['mean'], 'std': result['std_dev'],
+                'min': result['min'], 'max': result['max'], 'count': result['count']}
+
+    stats_results = {}
+    for metric in METRIC_EXPRESSIONS:
+        overall = streaming_stats.ColumnState(relative_accuracy)
+        overall.merge(stats.state('merged', metric))
+        overall.merge(stats.state('not_merged', metric))
+        stats_results[metric] = {
+            'merged': summary(stats.state('merged', metric)),
+            'not_merged': summary(stats.state('not_merged', metric)),
+            'overall': summary(overall)
+        }
+
+    return stats_results
+
 
+def convert_to_serializable(obj):
+    """Converte valores numpy para tipos nativos do Python (para JSON)"""
+    if isinstance(obj, (np.integer, np.int64)):
+        return int(obj)
+    elif isinstance(obj, (np.floating, np.float64)):
+        return float(obj)
+    elif isinstance(obj, np.bool_):
+        return bool(obj)
+    elif isinstance(obj, dict):
+        return {key: convert_to_serializable(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_to_serializable(item) for item in obj]
+    return obj
+
+
+def run_analysis(input_folder, store_folder=None, cache_folder=None):
+    """Carrega os datasets e retorna o DataFrame processado e as correlações e estatísticas descritivas (em tipos nativos do Python)"""
     print("📊 Carregando dados de todos os repositórios...")
-    df = load_all_datasets(input_folder)
+    df = load_all_datasets(input_folder, ANALYSIS_COLUMNS, store_folder=store_folder,
+                           cache_folder=cache_folder)
     print(f"✅ Total de PRs carregados: {len(df)}")
+    print(f"💾 Memória do DataFrame: {memory_report(df).sum():.1f} MB")
 
     print("\n🔧 Preparando dados e calculando métricas...")
     df = prepare_data(df)
@@ -192,25 +402,12 @@ def main():
     print("\n📊 Calculando estatísticas descritivas...")
     descriptive_stats = calculate_descriptive_stats(df)
 
-    # Salvar resultados em JSON
-    print("\n💾 Salvando resultados...")
+    return df, convert_to_serializable(correlations), convert_to_serializable(descriptive_stats)
 
-    # Converter valores numpy para tipos nativos do Python
-    def convert_to_serializable(obj):
-        if isinstance(obj, (np.integer, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
-            return float(obj)
-        elif isinstance(obj, np.bool_):
-            return bool(obj)
-        elif isinstance(obj, dict):
-            return {key: convert_to_serializable(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_to_serializable(item) for item in obj]
-        return obj
-
-    correlations = convert_to_serializable(correlations)
-    descriptive_stats = convert_to_serializable(descriptive_stats)
+
+def save_results(df, correlations, descriptive_stats, results_folder):
+    """Grava os resultados em JSON e o DataFrame processado em Parquet, com os tipos das colunas"""
+    os.makedirs(results_folder, exist_ok=True)
 
     with open(os.path.join(results_folder, 'correlations.json'), 'w', encoding='utf-8') as f:
         json.dump(correlations, f, indent=2, ensure_ascii=False)
@@ -218,17 +415,14 @@ def main():
     with open(os.path.join(results_folder, 'descriptive_stats.json'), 'w', encoding='utf-8') as f:
         json.dump(descriptive_stats, f, indent=2, ensure_ascii=False)
 
-    # Salvar DataFrame processado
-    df.to_csv(os.path.join(results_folder, 'processed_data.csv'), index=False)
+    df.to_parquet(os.path.join(results_folder, PROCESSED_DATA_FILE), index=False)
 
-    # =====================
-    # Geração de gráficos por RQ
-    # =====================
 
+def generate_rq_charts(df, correlations, charts_folder):
+    """Gera os gráficos de cada RQ (violinos por status e dispersão contra revisões)"""
     # Configs visuais
     sns.set_theme(style="whitegrid", palette="muted")
 
-    charts_folder = os.path.join(script_dir, '..', 'docs', 'charts')
     os.makedirs(charts_folder, exist_ok=True)
 
     def _annotate_corr(ax, key: str):
@@ -259,9 +453,9 @@ def main():
             data[data['is_merged'] == 0][metric_col]
         ], positions=[1, 2], showmeans=True, showmedians=True, widths=0.8)
 
-        for pc, color in zip(parts['bodies'], ['#2ca02c', '#d62728']):
-            pc.set_facecolor(color)
-            pc.set_alpha(0.6)
+        for body, color in zip(parts['bodies'], ['#2ca02c', '#d62728']):
+            body.set_facecolor(color)
+            body.set_alpha(0.6)
 
         ax = plt.gca()
         ax.set_xticks([1, 2])
@@ -362,16 +556,20 @@ def main():
                      'rq08_interactions_vs_reviews.png',
                      f"{metric_labels['interactions']} vs Número de Revisões")
 
-    print("\n" + "="*80)
-    print("RESUMO DAS CORRELAÇÕES (Spearman)")
-    print("="*80)
-    for key, value in correlations.items():
-        sig = "✓ Significante" if value['significant'] else "✗ Não significante"
-        print(f"\n{key}:")
-        print(f"  Correlação: {value['correlation']:.4f}")
-        print(f"  P-valor: {value['p_value']:.4f}")
-        print(f"  Amostras: {value['n_samples']}")
-        print(f"  {sig}")
+
+def print_summary(correlations, descriptive_stats):
+    """Imprime as correlações (se houver) e as medianas das estatísticas descritivas"""
+    if correlations is not None:
+        print("\n" + "="*80)
+        print("RESUMO DAS CORRELAÇÕES (Spearman)")
+        print("="*80)
+        for key, value in correlations.items():
+            sig = "✓ Significante" if value['significant'] else "✗ Não significante"
+            print(f"\n{key}:")
+            print(f"  Correlação: {value['correlation']:.4f}")
+            print(f"  P-valor: {value['p_value']:.4f}")
+            print(f"  Amostras: {value['n_samples']}")
+            print(f"  {sig}")
 
     print("\n" + "="*80)
     print("ESTATÍSTICAS DESCRITIVAS - MEDIANAS")
@@ -394,6 +592,61 @@ def main():
         print(
             f"  Não Merged - Mediana: {descriptive_stats[metric]['not_merged']['median']:.2f}")
 
+
+def run_descriptive_stats_only(input_folder, results_folder, database_path=None):
+    """Calcula só as estatísticas descritivas (pela base SQLite em `database_path` ou pelos CSVs em lotes) e grava descriptive_stats.json"""
+    if database_path is not None:
+        print(f"🗄️ Calculando estatísticas descritivas na base {database_path}...")
+        database = pr_database.PRDatabase(database_path)
+        descriptive_stats = calculate_descriptive_stats_sql(database)
+        database.close()
+    else:
+        print("📊 Calculando estatísticas descritivas com leitura em lotes dos CSVs...")
+        descriptive_stats = calculate_descriptive_stats_streaming(input_folder)
+    descriptive_stats = convert_to_serializable(descriptive_stats)
+
+    os.makedirs(results_folder, exist_ok=True)
+    with open(os.path.join(results_folder, 'descriptive_stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(descriptive_stats, f, indent=2, ensure_ascii=False)
+    return descriptive_stats
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    input_folder = os.path.join(script_dir, 'datasets')
+    results_folder = os.path.join(script_dir, 'results')
+    charts_folder = os.path.join(script_dir, '..', 'docs', 'charts')
+
+    parser = argparse.ArgumentParser(
+        description="Calcula correlações e estatísticas descritivas dos PRs coletados e gera os gráficos")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--database", nargs="?", const=pr_database.DEFAULT_DATABASE_FILE, default=None,
+                        help="Só calcula as estatísticas descritivas, com consultas na base SQLite "
+                             "do coletor (padrão: datasets.sqlite)")
+    source.add_argument("--streaming", action="store_true",
+                        help="Só calcula as estatísticas descritivas, lendo os CSVs em lotes "
+                             "(mediana aproximada)")
+    args = parser.parse_args()
+
+    if args.database is not None or args.streaming:
+        if args.database is not None and not os.path.exists(args.database):
+            parser.error(f"base não encontrada: {args.database}")
+        descriptive_stats = run_descriptive_stats_only(input_folder, results_folder, args.database)
+        print_summary(None, descriptive_stats)
+        print("\n✅ Estatísticas descritivas salvas em:", results_folder)
+        return
+
+    # Os CSVs passam pelo cache Arrow do dataset combinado; os repositórios
+    # coletados com --format parquet são lidos direto do dataset Parquet
+    df, correlations, descriptive_stats = run_analysis(
+        input_folder, dataset_store.DEFAULT_STORE_DIR, dataset_cache.DEFAULT_CACHE_DIR)
+
+    print("\n💾 Salvando resultados...")
+    save_results(df, correlations, descriptive_stats, results_folder)
+
+    generate_rq_charts(df, correlations, charts_folder)
+    print_summary(correlations, descriptive_stats)
+
     print("\n✅ Análise concluída! Arquivos salvos em:", results_folder)
 
 
@@ -0,0 +1,140 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import urllib.request
+from glob import glob
+
+from stub_server import StubState, SyntheticGitHub, create_server
+
+
+def _run_stub(queue, options: dict):
+    state = StubState(
+        SyntheticGitHub(options["repos"], options["prs_per_repo"], options["body_size"]),
+        latency=options["latency"], latency_per_node=options["latency_per_node"],
+        error_rate=options["error_rate"], throttle_rate=options["throttle_rate"],
+        retry_after=options["retry_after"], budget=options["budget"],
+    )
+    server = create_server(state)
+    queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _stub_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return json.load(response)
+
+
+def _run_mode(queue, mode: str, port: int, options: dict):
+    """Executa um modo do coletor num processo próprio, para medir o pico de RSS isolado."""
+    os.environ["TQDM_DISABLE"] = "1"
+    import collector
+
+    collector.GITHUB_API_URL = f"http://127.0.0.1:{port}/graphql"
+    collector.OUTPUT_DIR = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    # Sem manifesto: os repositórios vêm da busca do servidor local
+    collector.MANIFEST_FILE = os.path.join(collector.OUTPUT_DIR, "manifest.jsonl")
+    collector.PARQUET_DIR = os.path.join(collector.OUTPUT_DIR, "parquet")
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        if mode == "single":
+            collector.run_single_repo_mode("stub/repo-0", None)
+        elif mode == "multi":
+            collector.run_multi_repo_mode(None)
+        elif mode == "multi-async":
+            collector.run_async_multi_repo_mode(None, options["concurrency"])
+        elif mode == "multi-search":
+            collector.run_multi_repo_mode(None, use_search=True)
+    elapsed = time.perf_counter() - start
+
+    prs = 0
+    for filename in glob(os.path.join(collector.OUTPUT_DIR, "*.csv")):
+        with open(filename, "r", newline="", encoding="utf-8") as f:
+            prs += sum(1 for _ in csv.reader(f)) - 1
+
+    queue.put({
+        "elapsed": elapsed,
+        "prs": prs,
+        # ru_maxrss é reportado em KB no Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def run_benchmark(modes, options: dict) -> list:
+    """Sobe o servidor local e mede cada modo do coletor contra ele."""
+    ctx = multiprocessing.get_context("spawn")
+    port_queue = ctx.Queue()
+    stub = ctx.Process(target=_run_stub, args=(port_queue, options), daemon=True)
+    stub.start()
+    port = port_queue.get(timeout=30)
+
+    results = []
+    try:
+        for mode in modes:
+            before = _stub_stats(port)
+            result_queue = ctx.Queue()
+            worker = ctx.Process(target=_run_mode, args=(result_queue, mode, port, options))
+            worker.start()
+            result = result_queue.get()
+            worker.join()
+            after = _stub_stats(port)
+
+            requests_made = after["requests"] - before["requests"]
+            results.append({
+                "mode": mode,
+                "elapsed_s": round(result["elapsed"], 3),
+                "prs": result["prs"],
+                "requests": requests_made,
+                "prs_per_s": round(result["prs"] / result["elapsed"], 1),
+                "requests_per_s": round(requests_made / result["elapsed"], 1),
+                "errors_502": after["errors_502"] - before["errors_502"],
+                "throttled_429": after["throttled_429"] - before["throttled_429"],
+                "peak_rss_mb": round(result["peak_rss_mb"], 1),
+            })
+    finally:
+        stub.terminate()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede a vazão do coletor contra o servidor GraphQL local (stub_server.py)")
+    parser.add_argument("--modes", nargs="+", default=["single", "multi", "multi-async"],
+                        choices=["single", "multi", "multi-async", "multi-search"])
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--prs-per-repo", type=int, default=500)
+    parser.add_argument("--body-size", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-per-node", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--budget", type=int, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Concorrência do modo multi-async")
+    parser.add_argument("--output", help="Grava os resultados em JSON neste arquivo")
+    args = parser.parse_args()
+
+    options = vars(args)
+    results = run_benchmark(args.modes, options)
+
+    print(f"\n{'modo':<14}{'PRs':>8}{'req':>7}{'PRs/s':>10}{'req/s':>9}{'502':>6}{'429':>6}{'RSS (MB)':>10}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['prs']:>8}{r['requests']:>7}{r['prs_per_s']:>10}"
+              f"{r['requests_per_s']:>9}{r['errors_502']:>6}{r['throttled_429']:>6}{r['peak_rss_mb']:>10}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
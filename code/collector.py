@@ -3,49 +3,365 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import datetime
 import csv
+import json
 import os
 import time
 import random
 import argparse
+import asyncio
+import multiprocessing
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
+import numpy as np
 from tqdm import tqdm
 
-GITHUB_API_URL = "https://api.github.com/graphql"
-TOKEN = os.getenv("GITHUB_TOKEN")
-HEADERS = {"Authorization": f"Bearer {TOKEN}" if TOKEN else ""}
+import dataset_store
+from metrics import MetricsRecorder
+from pr_database import DEFAULT_DATABASE_FILE, PRDatabase
+from response_cache import CacheMiss, ResponseCache
+from work_queue import WorkQueue
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com/graphql")
+# Vários tokens podem ser informados em GITHUB_TOKENS, separados por vírgula
+TOKENS = [token.strip() for token in os.getenv("GITHUB_TOKENS", "").split(",") if token.strip()] \
+    or [os.getenv("GITHUB_TOKEN") or ""]
 
 SESSION = requests.Session()
+# A camada de transporte só repete falhas de conexão; status HTTP (5xx, 403/429)
+# são tratados em run_query junto com o RateLimitScheduler, sem retries empilhados.
 retry_strategy = Retry(
-    total=8,
-    backoff_factor=1.5,
-    status_forcelist=[429, 500, 502, 503, 504],
+    total=3,
+    connect=3,
+    read=0,
+    status=0,
+    backoff_factor=1,
     allowed_methods=["POST"],
     raise_on_status=False,
 )
-adapter = HTTPAdapter(max_retries=retry_strategy)
+# pool_maxsize cobre as conexões simultâneas do modo assíncrono (--concurrency)
+adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=64)
 SESSION.mount("https://", adapter)
 SESSION.mount("http://", adapter)
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, "datasets")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Dataset final: CSVs em datasets/, Parquet particionado por repositório em
+# datasets_parquet/ (dataset_store.py) ou ambos
+PARQUET_DIR = dataset_store.DEFAULT_STORE_DIR
+DATASET_FORMATS = ("csv", "parquet", "both")
+DATASET_FORMAT = "both"
 
 QUERY_DIR = os.path.join(SCRIPT_DIR, "queries")
 os.makedirs(QUERY_DIR, exist_ok=True)
 REPO_QUERY_FILE = os.path.join(QUERY_DIR, "repo_query.graphql")
 PRS_QUERY_FILE = os.path.join(QUERY_DIR, "pr_query.graphql")
+PR_FIELDS_FILE = os.path.join(QUERY_DIR, "pr_fields.graphql")
+PR_SEARCH_QUERY_FILE = os.path.join(QUERY_DIR, "pr_search_query.graphql")
+REPO_DISCOVERY_QUERY_FILE = os.path.join(QUERY_DIR, "repo_discovery_query.graphql")
+PR_DETAILS_QUERY_FILE = os.path.join(QUERY_DIR, "pr_details_query.graphql")
+PR_SEARCH_COUNT_QUERY_FILE = os.path.join(
+    QUERY_DIR, "pr_search_count_query.graphql")
+
+MANIFEST_FILE = os.path.join(SCRIPT_DIR, "manifest", "repositories.jsonl")
+DISCOVERY_MIN_STARS = 10000
+MAX_REPOS = 200
+# Máximo de IDs aceitos por `nodes(ids:)`
+DETAILS_BATCH_SIZE = 100
+
+PR_PAGE_SIZE = 50
+# Limite de nós por consulta da API GraphQL, usado para dimensionar as consultas agrupadas
+GRAPHQL_NODE_LIMIT = 500_000
+# Teto de custo (pontos) que o coletor se impõe por consulta agrupada; não é um limite da API
+BATCH_MAX_COST = 20
+# Esperas por rate limit (403/429 ou RATE_LIMITED) aceitas por consulta, além de max_retries
+RATE_LIMIT_MAX_RETRIES = 10
+# A busca do GitHub devolve no máximo 1000 resultados por consulta
+SEARCH_RESULT_CAP = 1000
+SEARCH_START_DATE = datetime.datetime(2008, 1, 1, tzinfo=datetime.timezone.utc)
+# Conexões aninhadas em PullRequestFields (comments, reviewThreads, participants, reviews)
+PR_NESTED_CONNECTIONS = 4
+
+
+def load_query(path: str) -> str:
+    """Lê uma consulta .graphql, anexando o fragmento PullRequestFields quando usado."""
+    with open(path, "r", encoding="utf-8") as f:
+        query = f.read()
+    if "...PullRequestFields" in query:
+        with open(PR_FIELDS_FILE, "r", encoding="utf-8") as f:
+            query = f"{query}\n{f.read()}"
+    return query
+
+
+def _parse_github_timestamp(value: str) -> float:
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class RateLimitScheduler:
+    """Espaça as requisições para que o orçamento de pontos da API dure até o resetAt da janela."""
+
+    def __init__(self, reset_margin: float = 1.0):
+        self._lock = threading.Lock()
+        self.reset_margin = reset_margin
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.cost = 1
+        self._next_slot = 0.0
+        # Pausa imposta pela API (403/429 ou RATE_LIMITED sem resetAt conhecido)
+        self._paused_until = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            if self.reset_at is not None and now >= self.reset_at:
+                # Nova janela: o orçamento volta ao limite cheio
+                self.remaining = None
+                self.reset_at = None
+
+            slot = max(now, self._next_slot)
+            if self.remaining is not None and self.remaining < self.cost:
+                slot = max(slot, self.reset_at + self.reset_margin)
+                print(
+                    f"⏸️ Orçamento de rate limit esgotado, aguardando até "
+                    f"{datetime.datetime.fromtimestamp(slot).strftime('%H:%M:%S')}...")
+                self.remaining = None
+                self.reset_at = None
+                self._next_slot = slot
+            else:
+                self._next_slot = slot + self._interval(slot)
+                if self.remaining is not None:
+                    # Reserva os pontos desta requisição até a resposta chegar
+                    self.remaining -= self.cost
+
+        pause = slot - time.time()
+        if pause > 0:
+            time.sleep(pause)
+
+    def _interval(self, now: float) -> float:
+        if self.remaining is None or self.reset_at is None or self.remaining <= 0:
+            return 0.0
+        return max(self.reset_at - now, 0.0) * self.cost / self.remaining
+
+    def update(self, rate_limit: Optional[dict], headers=None):
+        """Atualiza o orçamento a partir do campo `rateLimit` ou dos cabeçalhos."""
+        remaining = reset_at = cost = None
+        if rate_limit:
+            remaining = rate_limit.get("remaining")
+            cost = rate_limit.get("cost")
+            if rate_limit.get("resetAt"):
+                reset_at = _parse_github_timestamp(rate_limit["resetAt"])
+        elif headers is not None and headers.get("x-ratelimit-remaining") is not None:
+            remaining = int(headers["x-ratelimit-remaining"])
+            if headers.get("x-ratelimit-reset"):
+                reset_at = float(headers["x-ratelimit-reset"])
+        if remaining is None or reset_at is None:
+            return
+
+        with self._lock:
+            if cost:
+                self.cost = cost
+            if self.reset_at is None or reset_at > self.reset_at:
+                self.remaining, self.reset_at = remaining, reset_at
+            elif reset_at == self.reset_at:
+                # Respostas concorrentes chegam fora de ordem: vale o menor saldo
+                self.remaining = min(self.remaining, remaining) if self.remaining is not None else remaining
+
+    def exhaust(self, headers=None):
+        """Marca o orçamento como esgotado (erro RATE_LIMITED da API)."""
+        reset_header = headers.get("x-ratelimit-reset") if headers is not None else None
+        with self._lock:
+            if reset_header:
+                self.reset_at = float(reset_header)
+            if self.reset_at is None:
+                self._paused_until = max(self._paused_until, time.time() + 60)
+                self._next_slot = max(self._next_slot, self._paused_until)
+                return
+            self.remaining = 0
+
+    def pause_until(self, timestamp: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, timestamp)
+            self._next_slot = max(self._next_slot, timestamp)
+
+    def headroom(self) -> float:
+        """Pontos disponíveis; negativo (segundos até liberar) se o token está pausado ou sem orçamento."""
+        with self._lock:
+            now = time.time()
+            if self._paused_until > now:
+                return -(self._paused_until - now)
+            if self.remaining is None or self.reset_at is None or now >= self.reset_at:
+                # Orçamento ainda desconhecido ou janela renovada
+                return float("inf")
+            if self.remaining < self.cost:
+                return -(self.reset_at - now)
+            return float(self.remaining)
+
+
+class TokenPool:
+    """Distribui as requisições entre vários tokens, pelo que tiver mais pontos restantes."""
+
+    def __init__(self, tokens: List[str]):
+        self._lock = threading.Lock()
+        self.limiters = {token: RateLimitScheduler() for token in tokens}
+
+    def acquire(self):
+        """Retorna (token, scheduler) do token com mais folga."""
+        with self._lock:
+            token = max(self.limiters, key=lambda t: self.limiters[t].headroom())
+            return token, self.limiters[token]
+
+    def summary(self) -> List[dict]:
+        """Orçamento conhecido de cada token, identificado só pelos últimos caracteres."""
+        return [{"token": f"...{token[-4:]}" if token else "(sem token)",
+                 "remaining": limiter.remaining, "reset_at": limiter.reset_at}
+                for token, limiter in self.limiters.items()]
+
+
+TOKEN_POOL = TokenPool(TOKENS)
+
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, ".cache", "graphql")
+# Cache de respostas (desligado por padrão; ver configure_cache e --cache/--replay)
+RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def configure_cache(directory: str = DEFAULT_CACHE_DIR, ttl_hours: Optional[float] = None,
+                    max_mb: Optional[float] = None, replay: bool = False):
+    """Liga o cache de respostas em disco usado por run_query."""
+    global RESPONSE_CACHE
+    RESPONSE_CACHE = ResponseCache(
+        directory,
+        ttl_seconds=ttl_hours * 3600 if ttl_hours is not None else None,
+        max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None,
+        replay=replay,
+    )
+
+
+DEFAULT_METRICS_DIR = os.path.join(SCRIPT_DIR, "metrics")
+METRICS: Optional[MetricsRecorder] = None
+
+
+def configure_metrics(directory: str = DEFAULT_METRICS_DIR, prom_name: str = "collector.prom"):
+    """Liga o registro de métricas por requisição e por repositório (metrics.py)."""
+    global METRICS
+    METRICS = MetricsRecorder(directory, prom_name)
+
+
+DATABASE: Optional[PRDatabase] = None
+
+
+def configure_database(path: str = DEFAULT_DATABASE_FILE):
+    """Liga a gravação (upsert) de cada repositório terminado na base SQLite (pr_database.py)."""
+    global DATABASE
+    DATABASE = PRDatabase(path)
+
+
+def _record_request(query: str, variables: dict, status, call_started: float, latency: float,
+                    retries: int, response=None, data: Optional[dict] = None, token: str = ""):
+    if METRICS is None:
+        return
+    rate_limit = ((data or {}).get("data") or {}).get("rateLimit") or {}
+    METRICS.record_request(
+        query, variables, status, latency, retries,
+        wall_seconds=time.monotonic() - call_started,
+        response_bytes=response.raw.tell() if response is not None else 0,
+        cost=rate_limit.get("cost"), remaining=rate_limit.get("remaining"), token=token)
+
+
+class AdaptivePageSize:
+    """Ajusta o tamanho da página de PRs conforme a latência e as falhas das respostas."""
+
+    def __init__(self, initial: int = 50, minimum: int = 10, maximum: int = 100,
+                 fast_seconds: float = 3.0, slow_seconds: float = 10.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fast_seconds = fast_seconds
+        self.slow_seconds = slow_seconds
+
+    def record_success(self, elapsed: float):
+        if elapsed > self.slow_seconds:
+            self.size = max(self.minimum, int(self.size * 0.7))
+        elif elapsed < self.fast_seconds:
+            self.size = min(self.maximum, max(self.size + 5, int(self.size * 1.25)))
+
+    def record_failure(self):
+        self.size = max(self.minimum, self.size // 2)
+
+
+def _rate_limit_pause(response) -> Optional[float]:
+    """Segundos a aguardar se a resposta 403/429 for de rate limit, senão None."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        return float(retry_after)
+    if response.headers.get("x-ratelimit-remaining") == "0" and response.headers.get("x-ratelimit-reset"):
+        return max(float(response.headers["x-ratelimit-reset"]) - time.time(), 0) + 1
+    if response.status_code == 429 or "rate limit" in response.text.lower():
+        # Limite secundário sem cabeçalhos: a documentação pede ao menos um minuto
+        return 60.0
+    return None
+
 
+def _is_volatile_query(variables: dict) -> bool:
+    """Consultas cujo resultado muda com o tempo: primeiras páginas, buscas e a paginação por UPDATED_AT."""
+    return (("after" in variables and variables["after"] is None) or "owner0" in variables
+            or "q" in variables or variables.get("field") == "UPDATED_AT")
+
+
+def run_query(query, variables, max_retries=5, page_size: Optional[AdaptivePageSize] = None,
+              allow_partial: bool = False):
+    """Executa uma consulta GraphQL com retries; com `allow_partial`, devolve sem retry respostas com `data` e erros."""
+    _check_lease()
+    call_started = time.monotonic()
+    if RESPONSE_CACHE is not None and (RESPONSE_CACHE.replay or not _is_volatile_query(variables)):
+        entry = RESPONSE_CACHE.get(query, variables)
+        if entry is not None:
+            if page_size is not None:
+                # A latência gravada mantém o ajuste da página igual ao da coleta original
+                page_size.record_success(entry["elapsed"])
+            _record_request(query, variables, "cache", call_started, 0.0, 0)
+            return entry["data"]
+        if RESPONSE_CACHE.replay:
+            raise CacheMiss(
+                f"Consulta sem resposta no cache (replay): {json.dumps(variables, sort_keys=True)}")
 
-def run_query(query, variables, max_retries=5):
     delay = 2
-    for attempt in range(max_retries):
+    attempt = 0
+    retries = 0
+    status = None
+    started = call_started
+    throttled = 0
+    while attempt < max_retries and throttled <= RATE_LIMIT_MAX_RETRIES:
+        status = None
+        token, rate_limiter = TOKEN_POOL.acquire()
+        rate_limiter.wait()
+        if page_size is not None:
+            variables = {**variables, "pageSize": page_size.size}
         try:
+            started = time.monotonic()
             response = SESSION.post(
                 GITHUB_API_URL,
                 json={"query": query, "variables": variables},
-                headers=HEADERS,
+                headers={"Authorization": f"Bearer {token}" if token else ""},
                 timeout=45,
+                stream=True,
             )
+            status = response.status_code
+            if response.status_code in (403, 429):
+                pause = _rate_limit_pause(response)
+                if pause is not None:
+                    print(
+                        f"⏸️ Rate limit (HTTP {response.status_code}), aguardando {round(pause)}s...")
+                    if response.headers.get("x-ratelimit-remaining") == "0":
+                        # Orçamento primário esgotado: o token fica sem pontos até o reset
+                        rate_limiter.exhaust(response.headers)
+                    rate_limiter.pause_until(time.time() + pause)
+                    response.close()
+                    retries += 1
+                    throttled += 1
+                    continue
+
             if response.status_code != 200:
 
                 msg = response.text
@@ -60,78 +376,285 @@ def run_query(query, variables, max_retries=5):
                 raise Exception(f"HTTP {response.status_code}: {msg}")
 
             data = response.json()
+            rate_limiter.update(
+                (data.get("data") or {}).get("rateLimit"), response.headers)
             if "errors" in data and data["errors"]:
+                if any(error.get("type") == "RATE_LIMITED" for error in data["errors"]):
+                    # Orçamento do token esgotado: a próxima tentativa vai para outro token
+                    rate_limiter.exhaust(response.headers)
+                    retries += 1
+                    throttled += 1
+                    continue
 
-                raise Exception(f"GraphQL errors: {data['errors']}")
+                if not (allow_partial and data.get("data")):
+                    raise Exception(f"GraphQL errors: {data['errors']}")
 
             if "data" not in data:
                 raise Exception(f"Resposta inesperada: {data}")
 
+            elapsed = time.monotonic() - started
+            if page_size is not None:
+                page_size.record_success(elapsed)
+            if RESPONSE_CACHE is not None:
+                RESPONSE_CACHE.put(query, variables, data, elapsed)
+            _record_request(query, variables, status, call_started, elapsed, retries,
+                            response, data, token)
             return data
         except Exception as e:
+            if page_size is not None:
+                page_size.record_failure()
+            if status in (None, 200):
+                status = "error"
+            attempt += 1
+            retries += 1
             print(
-                f"⚠️ Erro na requisição ({e}), tentativa {attempt+1}/{max_retries}. Retentando em {delay}s...")
+                f"⚠️ Erro na requisição ({e}), tentativa {attempt}/{max_retries}. Retentando em {delay}s...")
             time.sleep(delay + random.uniform(0, 1))
             delay *= 2
+    # A última falha não é seguida de nova tentativa
+    _record_request(query, variables, status, call_started,
+                    time.monotonic() - started, max(retries - 1, 0))
     raise Exception("❌ Falha após várias tentativas.")
 
 
 def filter_prs(prs):
-    filtered = []
-    for pr in prs:
-        node = pr["node"]
-
-        if node["reviews"]["totalCount"] < 1:
-            continue
-
-        created = datetime.datetime.fromisoformat(
-            node["createdAt"].replace("Z", "+00:00"))
-        closed_or_merged = node["mergedAt"] or node["closedAt"]
-        if not closed_or_merged:
+    """Filtra PRs no formato `edges` e devolve as 7 primeiras colunas do CSV."""
+    rows = transform_pr_page([pr["node"] for pr in prs])
+    return [row[:7] for row in rows if row is not None]
+
+
+CSV_HEADER = [
+    "number",
+    "title",
+    "author",
+    "createdAt",
+    "closedOrMergedAt",
+    "reviewsCount",
+    "hoursOpen",
+    "merged",
+    "additions",
+    "deletions",
+    "changedFiles",
+    "bodyLength",
+    "issueCommentsCount",
+    "reviewThreadsCount",
+    "interactionsCount",
+    "finalReviewState",
+    "nodeId",
+    "reviewers",
+    "firstResponseHours",
+]
+
+
+def _checkpoint_paths(repo_name: str):
+    checkpoint_dir = os.path.join(OUTPUT_DIR, ".checkpoints")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    stem = repo_name.replace("/", "_")
+    return (os.path.join(checkpoint_dir, f"{stem}.json"),
+            os.path.join(checkpoint_dir, f"{stem}.partial.csv"))
+
+
+class RepoCSVWriter:
+    """Grava os PRs de um repositório página a página no arquivo parcial em .checkpoints/, com checkpoint por página."""
+
+    def __init__(self, repo_name: str, mode: str = "pullRequests"):
+        self.repo_name = repo_name
+        self.mode = mode
+        self.state_path, self.rows_path = _checkpoint_paths(repo_name)
+        self.lanes = {}
+        self.rows = 0
+        self._size = 0
+        self._started = time.monotonic()
+
+        if os.path.exists(self.state_path) and os.path.exists(self.rows_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            with open(self.rows_path, "r", newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), [])
+            if state.get("mode", "pullRequests") != mode:
+                print(
+                    f"⚠️ Checkpoint de {repo_name} é de outro modo de coleta, recomeçando do zero.")
+            elif header != CSV_HEADER:
+                print(
+                    f"⚠️ Checkpoint de {repo_name} tem outras colunas no CSV, recomeçando do zero.")
+            elif os.path.getsize(self.rows_path) >= state["bytes"]:
+                # Linhas gravadas depois do último checkpoint são descartadas
+                os.truncate(self.rows_path, state["bytes"])
+                self.lanes, self.rows, self._size = state["lanes"], state["rows"], state["bytes"]
+                print(
+                    f"↩️ Retomando {repo_name} do checkpoint ({self.rows} PRs já coletados)")
+            else:
+                print(
+                    f"⚠️ Checkpoint de {repo_name} inconsistente, recomeçando do zero.")
+
+        if not self.lanes:
+            with open(self.rows_path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(CSV_HEADER)
+                self._size = f.tell()
+
+    @property
+    def done(self) -> bool:
+        return any(lane["done"] for lane in self.lanes.values())
+
+    def lane(self, direction: str) -> dict:
+        return self.lanes.setdefault(
+            direction, {"endCursor": None, "frontier": None, "done": False})
+
+    def write_page(self, page_rows: list, discarded: int = 0):
+        """Anexa as linhas de uma página (e quantos PRs ela descartou) e grava o checkpoint."""
+        _check_lease()
+        if METRICS is not None:
+            METRICS.record_page(self.repo_name, len(page_rows), discarded)
+        with open(self.rows_path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(page_rows)
+            f.flush()
+            os.fsync(f.fileno())
+            self._size = f.tell()
+        self.rows += len(page_rows)
+
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"repository": self.repo_name, "mode": self.mode, "rows": self.rows,
+                       "bytes": self._size, "lanes": self.lanes}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _sort_newest_first(self):
+        """Reordena o arquivo parcial do PR mais novo para o mais antigo, como numa coleta só pela frente DESC."""
+        with open(self.rows_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+        created_at, number = header.index("createdAt"), header.index("number")
+        rows.sort(key=lambda row: (row[created_at], int(row[number])), reverse=True)
+        tmp_path = f"{self.rows_path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        os.replace(tmp_path, self.rows_path)
+
+    def finalize(self) -> int:
+        """Move o arquivo parcial para o CSV final e remove o checkpoint."""
+        _check_lease()
+        if len(self.lanes) > 1:
+            # As frentes DESC e ASC intercalam suas páginas no arquivo parcial
+            self._sort_newest_first()
+        filename = os.path.join(
+            OUTPUT_DIR, f"{self.repo_name.replace('/', '_')}.csv")
+        os.replace(self.rows_path, filename)
+        clear_checkpoint(self.repo_name)
+        filename = publish_repo_dataset(self.repo_name)
+        if METRICS is not None:
+            METRICS.record_repository(self.repo_name, self.mode, time.monotonic() - self._started)
+        print(f"✅ PRs do repo {self.repo_name} salvos em {filename}")
+        return self.rows
+
+
+def clear_checkpoint(repo_name: str):
+    for path in _checkpoint_paths(repo_name):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def publish_repo_dataset(repo_name: str) -> str:
+    """Publica o CSV final de um repositório conforme DATASET_FORMAT (e na base SQLite, se ligada); retorna onde os PRs ficaram."""
+    stem = repo_name.replace("/", "_")
+    filename = os.path.join(OUTPUT_DIR, f"{stem}.csv")
+    if DATABASE is not None:
+        DATABASE.upsert_csv(stem, filename)
+    if DATASET_FORMAT == "csv":
+        return filename
+    partition = dataset_store.write_partition(stem, filename, PARQUET_DIR)
+    if DATASET_FORMAT == "parquet":
+        os.remove(filename)
+        return partition
+    return filename
+
+
+def _repo_csv_path(repo_name: str) -> str:
+    """CSV final do repositório, recriado a partir da partição Parquet quando só ela existe."""
+    stem = repo_name.replace("/", "_")
+    filename = os.path.join(OUTPUT_DIR, f"{stem}.csv")
+    if not os.path.exists(filename) and os.path.exists(dataset_store.partition_path(stem, PARQUET_DIR)):
+        dataset_store.export_csv(stem, filename, PARQUET_DIR)
+    return filename
+
+
+def _list_processed_repos() -> set:
+    """Repositórios com CSV ou partição Parquet final; coletas interrompidas ficam em .checkpoints/."""
+    return {f[:-len(".csv")] for f in os.listdir(OUTPUT_DIR)
+            if f.endswith(".csv") and not f.startswith(".")} \
+        | set(dataset_store.list_partitions(PARQUET_DIR))
+
+
+def _first_page_batch_size(page_size: int = PR_PAGE_SIZE) -> int:
+    """Quantos repositórios cabem numa consulta agrupada sem passar dos limites de nós e de custo da API."""
+    nodes_per_repo = page_size * (1 + PR_NESTED_CONNECTIONS)
+    cost_per_repo = (1 + page_size * PR_NESTED_CONNECTIONS) / 100
+    return max(1, min(GRAPHQL_NODE_LIMIT // nodes_per_repo, int(BATCH_MAX_COST // cost_per_repo)))
+
+
+def build_first_page_batch_query(count: int, page_size: int = PR_PAGE_SIZE) -> str:
+    """Monta uma consulta com `count` aliases `repoN`, cada um com a primeira página de PRs."""
+    params = "\n".join(
+        f"  $owner{i}: String!\n  $name{i}: String!" for i in range(count))
+    aliases = "\n".join(f"""  repo{i}: repository(owner: $owner{i}, name: $name{i}) {{
+    pullRequests(
+      states: [MERGED, CLOSED]
+      orderBy: {{ field: CREATED_AT, direction: DESC }}
+      first: {page_size}
+    ) {{
+      totalCount
+      pageInfo {{
+        hasNextPage
+        endCursor
+      }}
+      nodes {{
+        ...PullRequestFields
+      }}
+    }}
+  }}""" for i in range(count))
+    with open(PR_FIELDS_FILE, "r", encoding="utf-8") as f:
+        fragment = f.read()
+    return f"""query FirstPullRequestPages(
+{params}
+) {{
+{aliases}
+  rateLimit {{
+    cost
+    remaining
+    resetAt
+  }}
+}}
+
+{fragment}"""
+
+
+def fetch_first_pages(repos: List[tuple]) -> dict:
+    """Busca em consultas agrupadas a primeira página de PRs de cada (owner, name); retorna {"owner/name": pullRequests}."""
+    pages = {}
+    batch_size = _first_page_batch_size()
+    for start in range(0, len(repos), batch_size):
+        batch = repos[start:start + batch_size]
+        variables = {}
+        for i, (owner, name) in enumerate(batch):
+            variables[f"owner{i}"] = owner
+            variables[f"name{i}"] = name
+        try:
+            # Erro num alias (repositório removido, renomeado...) não deve custar os retries do lote:
+            # os demais aliases são aproveitados e os que falharam seguem repositório a repositório
+            data = run_query(build_first_page_batch_query(len(batch)), variables, allow_partial=True)
+        except Exception as e:
+            print(f"⚠️ Consulta agrupada falhou ({e}), seguindo repositório a repositório.")
             continue
-
-        closed_or_merged = datetime.datetime.fromisoformat(
-            closed_or_merged.replace("Z", "+00:00"))
-        delta = closed_or_merged - created
-
-        if delta.total_seconds() >= 3600:
-            hours = round(delta.total_seconds() / 3600, 2)
-            filtered.append([
-                node["number"],
-                node["title"],
-                node["author"]["login"] if node["author"] else "unknown",
-                node["createdAt"],
-                closed_or_merged.isoformat(),
-                node["reviews"]["totalCount"],
-                hours
-            ])
-    return filtered
-
-
-def save_repo_csv(repo_name, data):
-    filename = os.path.join(OUTPUT_DIR, f"{repo_name.replace('/', '_')}.csv")
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "number",
-            "title",
-            "author",
-            "createdAt",
-            "closedOrMergedAt",
-            "reviewsCount",
-            "hoursOpen",
-            "merged",
-            "additions",
-            "deletions",
-            "changedFiles",
-            "bodyLength",
-            "issueCommentsCount",
-            "reviewThreadsCount",
-            "interactionsCount",
-            "finalReviewState",
-        ])
-        writer.writerows(data)
-    print(f"✅ PRs do repo {repo_name} salvos em {filename}")
+        if data.get("errors"):
+            print(f"⚠️ {len(data['errors'])} erro(s) na consulta agrupada; "
+                  f"os repositórios afetados seguem repositório a repositório.")
+        for i, (owner, name) in enumerate(batch):
+            repository = data["data"].get(f"repo{i}")
+            if repository:
+                pages[f"{owner}/{name}"] = repository["pullRequests"]
+    return pages
 
 
 def _compute_final_review_state(review_nodes: List[dict]) -> str:
@@ -146,92 +669,164 @@ def _compute_final_review_state(review_nodes: List[dict]) -> str:
     return nodes[-1].get("state", "NONE") or "NONE"
 
 
-def collect_single_repo(owner: str, name: str, max_prs: Optional[int] = None):
+def _extract_pr_nodes(pr_container: dict) -> List[dict]:
+    """Retorna os nós de PR de uma página, aceitando tanto `nodes` quanto `edges`."""
+    if "nodes" in pr_container:
+        return pr_container["nodes"]
+    return [edge["node"] for edge in pr_container.get("edges", [])]
+
+
+def _timestamp_column(values: List[Optional[str]]) -> np.ndarray:
+    """Converte timestamps ISO 8601 da API (`...Z`) em datetime64[ms]; None vira NaT."""
+    return np.array([value[:-1] if value and value.endswith("Z") else value
+                     for value in values], dtype="datetime64[ms]")
+
+
+def _isoformat_utc(value: str) -> str:
+    """Mesmo resultado de `datetime.fromisoformat(...).isoformat()`, sem o parse no caso comum."""
+    if len(value) == 20 and value.endswith("Z"):
+        return value[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+
+
+def transform_pr_page(nodes: List[dict]) -> List[Optional[list]]:
+    """Converte uma página de nós de PR em linhas do CSV, em lote (None para os PRs que não passam nos filtros)."""
+    if not nodes:
+        return []
+
+    reviews = [node.get("reviews") or {} for node in nodes]
+    reviews_total = np.array([r.get("totalCount", 0) for r in reviews], dtype=np.int64)
+    closed_raw = [node.get("mergedAt") or node.get("closedAt") for node in nodes]
+
+    created = _timestamp_column([node["createdAt"] for node in nodes])
+    closed = _timestamp_column(closed_raw)
+    open_ms = (closed - created).astype(np.int64)
+    keep = (reviews_total >= 1) & ~np.isnat(closed) & (open_ms >= 3_600_000)
+    selected = np.flatnonzero(keep)
+    if not len(selected):
+        return [None] * len(nodes)
+
+    # Só as colunas dos PRs que passaram nos filtros voltam para objetos Python
+    hours = (open_ms[selected] / 1000 / 3600).tolist()
+    issue_comments = np.array([(nodes[i].get("comments") or {}).get("totalCount", 0)
+                               for i in selected.tolist()], dtype=np.int64)
+    review_threads = np.array([(nodes[i].get("reviewThreads") or {}).get("totalCount", 0)
+                               for i in selected.tolist()], dtype=np.int64)
+    interactions = (issue_comments + review_threads).tolist()
+    issue_comments, review_threads = issue_comments.tolist(), review_threads.tolist()
+
+    rows = [None] * len(nodes)
+    for j, i in enumerate(selected.tolist()):
+        node = nodes[i]
+        review_nodes = reviews[i].get("nodes") or []
+        if review_nodes:
+            final_state = _compute_final_review_state(review_nodes)
+        else:
+            final_state = "MERGED" if node.get("merged") else "CLOSED"
+
+        rows[i] = [
+            node["number"],
+            node.get("title") or "",
+            (node.get("author") or {}).get("login", "unknown"),
+            node["createdAt"],
+            _isoformat_utc(closed_raw[i]),
+            reviews[i]["totalCount"],
+            round(hours[j], 2),
+            bool(node.get("merged")),
+            node.get("additions") or 0,
+            node.get("deletions") or 0,
+            node.get("changedFiles") or 0,
+            node["bodyLength"] if "bodyLength" in node else len(node.get("bodyText") or ""),
+            issue_comments[j],
+            review_threads[j],
+            interactions[j],
+            final_state,
+            node.get("id") or "",
+            # Preenchidos pela etapa de enriquecimento (enrich_repo_csv)
+            "",
+            "",
+        ]
+    return rows
+
+
+def _lane_crossed(lanes: dict, direction: str, number: int) -> bool:
+    """True se o PR `number` já foi processado pela frente de direção oposta."""
+    other = lanes.get("ASC" if direction == "DESC" else "DESC")
+    if not other or other["frontier"] is None:
+        return False
+    return number <= other["frontier"] if direction == "DESC" else number >= other["frontier"]
+
+
+def collect_single_repo(owner: str, name: str, max_prs: Optional[int] = None, writer: Optional[RepoCSVWriter] = None):
     """Generator que coleta PRs de um único repositório, retornando um PR por vez."""
-    after = None
-    with open(os.path.join(QUERY_DIR, "pr_query.graphql"), "r") as f:
-        query = f.read()
+    query = load_query(PRS_QUERY_FILE)
+
+    lanes = writer.lanes if writer else {}
+    lane = writer.lane("DESC") if writer else {
+        "endCursor": None, "frontier": None, "done": False}
+    total = writer.rows if writer else 0
+    if (writer and writer.done) or (max_prs and total >= max_prs):
+        return
 
-    total = 0
+    page_size = AdaptivePageSize(initial=PR_PAGE_SIZE)
     while True:
-        data = run_query(query, {"owner": owner, "name": name, "after": after})
+        data = run_query(
+            query, {"owner": owner, "name": name, "after": lane["endCursor"]},
+            page_size=page_size)
         pr_container = data["data"]["repository"]["pullRequests"]
-
-        if "nodes" in pr_container:
-            pr_nodes = pr_container["nodes"]
-        else:
-            pr_nodes = [edge["node"] for edge in pr_container.get("edges", [])]
+        pr_nodes = _extract_pr_nodes(pr_container)
         page_info = pr_container["pageInfo"]
 
-        for node in pr_nodes:
-            reviews_total = (node.get("reviews") or {}).get("totalCount", 0)
-            if reviews_total < 1:
-                continue
+        page_rows = []
+        discarded = 0
+        finished = False
+        for node, row in zip(pr_nodes, transform_pr_page(pr_nodes)):
+            if _lane_crossed(lanes, "DESC", node["number"]):
+                finished = True
+                break
+            lane["frontier"] = node["number"]
 
-            created = datetime.datetime.fromisoformat(
-                node["createdAt"].replace("Z", "+00:00"))
-            closed_or_merged_raw = node.get("mergedAt") or node.get("closedAt")
-            if not closed_or_merged_raw:
-                continue
-            closed_or_merged = datetime.datetime.fromisoformat(
-                closed_or_merged_raw.replace("Z", "+00:00"))
-            delta = closed_or_merged - created
-            if delta.total_seconds() < 3600:
+            if row is None:
+                discarded += 1
                 continue
 
-            hours = round(delta.total_seconds() / 3600, 2)
-            additions = node.get("additions") or 0
-            deletions = node.get("deletions") or 0
-            changed_files = node.get("changedFiles") or 0
-            body_len = len(node.get("bodyText") or "")
-            issue_comments = (node.get("comments") or {}).get("totalCount", 0)
-            review_threads = (node.get("reviewThreads")
-                              or {}).get("totalCount", 0)
-            interactions = issue_comments + review_threads
-
-            review_nodes = ((node.get("reviews") or {}).get("nodes") or [])
-            if review_nodes:
-                final_state = _compute_final_review_state(review_nodes)
-            else:
+            page_rows.append(row)
+            if max_prs and total + len(page_rows) >= max_prs:
+                finished = True
+                break
 
-                final_state = "MERGED" if node.get("merged") else "CLOSED"
-
-            yield [
-                node["number"],
-                node.get("title") or "",
-                (node.get("author") or {}).get("login", "unknown"),
-                node["createdAt"],
-                closed_or_merged.isoformat(),
-                reviews_total,
-                hours,
-                bool(node.get("merged")),
-                additions,
-                deletions,
-                changed_files,
-                body_len,
-                issue_comments,
-                review_threads,
-                interactions,
-                final_state,
-            ]
-            total += 1
-            if max_prs and total >= max_prs:
-                return
+        total += len(page_rows)
+        lane["endCursor"] = page_info["endCursor"]
+        lane["done"] = finished or not page_info["hasNextPage"]
+        if writer:
+            writer.write_page(page_rows, discarded)
 
-        if page_info["hasNextPage"]:
-            after = page_info["endCursor"]
-        else:
+        yield from page_rows
+        if lane["done"]:
             break
 
 
-def run_single_repo_mode(repo: str, max_prs: int | None):
+def run_single_repo_mode(repo: str, max_prs: int | None, since_last_run: bool = False,
+                         use_search: bool = False):
     if "/" not in repo:
         raise SystemExit(
             "--repo deve estar no formato owner/name, ex: facebook/react")
 
     owner, name = repo.split("/", 1)
     start_time = time.time()
-    collected = []
+
+    if since_last_run and repo.replace("/", "_") in _list_processed_repos():
+        collect_repo_delta(owner, name, load_query(PRS_QUERY_FILE))
+        elapsed = round((time.time() - start_time) / 60, 2)
+        print(f"\n✅ {owner}/{name} atualizado em {elapsed} minutos")
+        return
+
+    if use_search:
+        collected = collect_repo_prs_search(owner, name, max_prs)
+        elapsed = round((time.time() - start_time) / 60, 2)
+        print(
+            f"\n✅ {collected} PRs coletados de {owner}/{name} em {elapsed} minutos")
+        return
 
     repo_data = run_query(
         """
@@ -241,6 +836,11 @@ def run_single_repo_mode(repo: str, max_prs: int | None):
               totalCount
             }
           }
+          rateLimit {
+            cost
+            remaining
+            resetAt
+          }
         }
         """,
         {"owner": owner, "name": name}
@@ -248,170 +848,911 @@ def run_single_repo_mode(repo: str, max_prs: int | None):
 
     total_prs = repo_data["data"]["repository"]["pullRequests"]["totalCount"]
 
-    with tqdm(total=total_prs, desc=f"PRs {owner}/{name}", unit="pr") as pbar:
-        for pr in collect_single_repo(owner, name, max_prs):
-            collected.append(pr)
+    writer = RepoCSVWriter(f"{owner}/{name}")
+    with tqdm(total=total_prs, initial=writer.rows, desc=f"PRs {owner}/{name}", unit="pr") as pbar:
+        for _ in collect_single_repo(owner, name, max_prs, writer=writer):
             pbar.update(1)
 
-    save_repo_csv(f"{owner}/{name}", collected)
+    collected = writer.finalize()
 
     elapsed = round((time.time() - start_time) / 60, 2)
     print(
-        f"\n✅ {len(collected)} PRs coletados de {owner}/{name} em {elapsed} minutos")
+        f"\n✅ {collected} PRs coletados de {owner}/{name} em {elapsed} minutos")
 
 
-def run_multi_repo_mode(max_prs: int | None):
+def _select_repos(edges: list, limit: int) -> List[dict]:
+    """Repositórios de uma página da busca que entram na coleta (>= 100 PRs), até `limit`."""
+    selected = [repo["node"] for repo in edges
+                if repo["node"]["pullRequests"]["totalCount"] >= 100]
+    return selected[:limit]
+
+
+def _discovery_search(min_stars: int, max_stars: Optional[int] = None) -> str:
+    stars = f"{min_stars}..{max_stars}" if max_stars is not None else f">={min_stars}"
+    return f"stars:{stars} sort:stars-desc"
+
+
+def _page_discovery_search(query_text: str, search: str, first_page: dict):
+    """Percorre as páginas de uma busca de repositórios a partir da primeira já obtida."""
+    page = first_page
+    while True:
+        for edge in page["edges"]:
+            if edge.get("node"):
+                yield edge["node"]
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        page = run_query(query_text, {
+            "q": search, "after": page["pageInfo"]["endCursor"]})["data"]["search"]
+
+
+def discover_repos(min_stars: int = DISCOVERY_MIN_STARS, max_repos: Optional[int] = None,
+                   manifest_path: str = MANIFEST_FILE) -> int:
+    """Lista os repositórios com pelo menos min_stars estrelas e grava o manifesto."""
+    query_text = load_query(REPO_DISCOVERY_QUERY_FILE)
+    repos = {}
+
+    search = _discovery_search(min_stars)
+    first_page = run_query(query_text, {"q": search, "after": None})["data"]["search"]
+    if first_page["repositoryCount"] <= SEARCH_RESULT_CAP or not first_page["edges"]:
+        ranges = [(search, first_page)]
+        pending = []
+    else:
+        ranges = []
+        pending = [(min_stars, first_page["edges"][0]["node"]["stargazerCount"])]
+
+    with tqdm(desc="Descobrindo repositórios", unit="repos") as pbar:
+        while ranges or pending:
+            if not ranges:
+                low, high = pending.pop()
+                search = _discovery_search(low, high)
+                page = run_query(query_text, {"q": search, "after": None})["data"]["search"]
+                if page["repositoryCount"] > SEARCH_RESULT_CAP and low < high:
+                    middle = max(low, min(int((low * high) ** 0.5), high - 1))
+                    # A faixa de cima sai primeiro da pilha
+                    pending.extend([(low, middle), (middle + 1, high)])
+                    continue
+                if page["repositoryCount"] > SEARCH_RESULT_CAP:
+                    print(f"⚠️ {page['repositoryCount']} repositórios com exatamente {low} estrelas; "
+                          f"só os primeiros {SEARCH_RESULT_CAP} são listados.")
+                ranges.append((search, page))
+
+            search, page = ranges.pop()
+            for repo_node in _page_discovery_search(query_text, search, page):
+                repos[f"{repo_node['owner']['login']}/{repo_node['name']}"] = repo_node
+                pbar.update(1)
+            if max_repos and len(repos) >= max_repos:
+                break
+
+    ordered = sorted(repos.values(), key=lambda node: node["stargazerCount"], reverse=True)
+    if max_repos:
+        ordered = ordered[:max_repos]
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for repo_node in ordered:
+            f.write(json.dumps(repo_node, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, manifest_path)
+    print(f"🗂️ {len(ordered)} repositórios gravados em {manifest_path}")
+    return len(ordered)
+
+
+def load_manifest(manifest_path: str = MANIFEST_FILE) -> List[dict]:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _repo_batches(limit: int = MAX_REPOS, manifest_path: Optional[str] = None):
+    """Lotes de repositórios a coletar (>= 100 PRs), até limit no total, do manifesto ou da busca."""
+    manifest_path = manifest_path or MANIFEST_FILE
+    if os.path.exists(manifest_path):
+        selected = _select_repos(
+            [{"node": node} for node in load_manifest(manifest_path)], limit)
+        for i in range(0, len(selected), 20):
+            yield selected[i:i + 20]
+        return
+
+    repo_query_text = load_query(REPO_QUERY_FILE)
+    after_repo = None
+    while limit > 0:
+        repo_data = run_query(repo_query_text, {"after": after_repo})
+        repo_nodes = _select_repos(repo_data["data"]["search"]["edges"], limit)
+        limit -= len(repo_nodes)
+        yield repo_nodes
+
+        page_info = repo_data["data"]["search"]["pageInfo"]
+        if not page_info["hasNextPage"]:
+            break
+        after_repo = page_info["endCursor"]
+
+
+def _prefetch_first_pages(repo_nodes: List[dict], processed_repos: set) -> dict:
+    """Primeiras páginas, em consultas agrupadas, dos repositórios que ainda serão coletados."""
+    pending = []
+    for repo_node in repo_nodes:
+        owner, name = repo_node["owner"]["login"], repo_node["name"]
+        if f"{owner}_{name}" in processed_repos:
+            continue
+        if os.path.exists(_checkpoint_paths(f"{owner}/{name}")[0]):
+            # Coleta interrompida: retoma do cursor salvo, não da primeira página
+            continue
+        pending.append((owner, name))
+    return fetch_first_pages(pending) if pending else {}
+
+
+def run_multi_repo_mode(max_prs: int | None, since_last_run: bool = False, use_search: bool = False,
+                        max_repos: int = MAX_REPOS):
     """Executa o fluxo para varrer múltiplos repositórios populares."""
     start_time = time.time()
-    repo_count = 0
-    after_repo = None
 
-    processed_repos = {f.split(".csv")[0] for f in os.listdir(OUTPUT_DIR)}
+    processed_repos = _list_processed_repos()
 
-    with open(REPO_QUERY_FILE, "r", encoding="utf-8") as f:
-        repo_query_text = f.read()
-    with open(PRS_QUERY_FILE, "r", encoding="utf-8") as f:
-        prs_query_text = f.read()
+    prs_query_text = load_query(PRS_QUERY_FILE)
 
-    with tqdm(total=200, desc="Processando repositórios", unit="repos") as pbar_repos:
-        while repo_count < 200:
-            repo_data = run_query(repo_query_text, {"after": after_repo})
-            edges = repo_data["data"]["search"]["edges"]
+    with tqdm(total=max_repos, desc="Processando repositórios", unit="repos") as pbar_repos:
+        for repo_nodes in _repo_batches(max_repos):
+            first_pages = {} if use_search else _prefetch_first_pages(
+                repo_nodes, processed_repos)
 
-            for repo in edges:
-                repo_node = repo["node"]
+            for repo_node in repo_nodes:
                 owner = repo_node["owner"]["login"]
                 name = repo_node["name"]
                 repo_name = f"{owner}/{name}"
 
-                if repo_node["pullRequests"]["totalCount"] < 100:
-                    continue
-
                 if repo_name.replace("/", "_") in processed_repos:
-                    print(f"⏭️ Pulando {repo_name}, já processado.")
-                    repo_count += 1
+                    if since_last_run:
+                        collect_repo_delta(owner, name, prs_query_text)
+                    else:
+                        print(f"⏭️ Pulando {repo_name}, já processado.")
                     pbar_repos.update(1)
                     continue
 
-                repo_prs = collect_repo_prs(
-                    owner, name, repo_node, prs_query_text, max_prs=max_prs)
-                save_repo_csv(repo_name, repo_prs)
+                if use_search:
+                    collect_repo_prs_search(owner, name, max_prs=max_prs)
+                else:
+                    collect_repo_prs(
+                        owner, name, repo_node, prs_query_text, max_prs=max_prs,
+                        first_page=first_pages.get(repo_name))
 
-                repo_count += 1
                 pbar_repos.update(1)
 
-                if repo_count >= 200:
-                    break
-
-            page_info = repo_data["data"]["search"]["pageInfo"]
-            if page_info["hasNextPage"]:
-                after_repo = page_info["endCursor"]
-            else:
-                break
-
     elapsed = round((time.time() - start_time) / 60, 2)
     print(f"\n✅ Tempo total de execução (multi-repo): {elapsed} minutos")
 
 
-def collect_repo_prs(owner: str, name: str, repo_node: dict, prs_query_text: str, max_prs: Optional[int] = None) -> list:
+def collect_repo_prs(owner: str, name: str, repo_node: dict, prs_query_text: str, max_prs: Optional[int] = None,
+                     first_page: Optional[dict] = None) -> int:
     """Coleta PRs de um repositório com barra de progresso, limitado por max_prs."""
-    after_pr = None
-    repo_prs = []
+    writer = RepoCSVWriter(f"{owner}/{name}")
+    lanes = writer.lanes
+    lane = writer.lane("DESC")
+
     pr_total = repo_node["pullRequests"]["totalCount"]
     total_to_collect = min(pr_total, max_prs) if max_prs else pr_total
 
+    page_size = AdaptivePageSize(initial=PR_PAGE_SIZE)
+
     with tqdm(total=total_to_collect, desc=f"PRs {owner}/{name}", unit="pr", leave=False) as pbar_prs:
-        while True:
-            prs_data = run_query(
-                prs_query_text, {"owner": owner, "name": name, "after": after_pr})
-            pr_container = prs_data["data"]["repository"]["pullRequests"]
-            if "nodes" in pr_container:
-                pr_nodes = pr_container["nodes"]
+        while not writer.done and not (max_prs and writer.rows >= max_prs):
+            if first_page is not None and lane["endCursor"] is None:
+                pr_container = first_page
             else:
-                pr_nodes = [edge["node"]
-                            for edge in pr_container.get("edges", [])]
+                prs_data = run_query(
+                    prs_query_text, {"owner": owner, "name": name, "after": lane["endCursor"]},
+                    page_size=page_size)
+                pr_container = prs_data["data"]["repository"]["pullRequests"]
+            first_page = None
+            pr_nodes = _extract_pr_nodes(pr_container)
+
+            page_rows = []
+            discarded = 0
+            finished = False
+            for node, row in zip(pr_nodes, transform_pr_page(pr_nodes)):
+                if _lane_crossed(lanes, "DESC", node["number"]):
+                    finished = True
+                    break
+                lane["frontier"] = node["number"]
 
-            for node in pr_nodes:
-                reviews_total = (node.get("reviews") or {}
-                                 ).get("totalCount", 0)
-                if reviews_total < 1:
-                    continue
-                created = datetime.datetime.fromisoformat(
-                    node["createdAt"].replace("Z", "+00:00"))
-                closed_or_merged_raw = node.get(
-                    "mergedAt") or node.get("closedAt")
-                if not closed_or_merged_raw:
-                    continue
-                closed_or_merged = datetime.datetime.fromisoformat(
-                    closed_or_merged_raw.replace("Z", "+00:00"))
-                delta = closed_or_merged - created
-                if delta.total_seconds() < 3600:
+                if row is None:
+                    discarded += 1
                     continue
 
-                hours = round(delta.total_seconds() / 3600, 2)
-                additions = node.get("additions") or 0
-                deletions = node.get("deletions") or 0
-                changed_files = node.get("changedFiles") or 0
-                body_len = len(node.get("bodyText") or "")
-                issue_comments = (node.get("comments") or {}
-                                  ).get("totalCount", 0)
-                review_threads = (node.get("reviewThreads")
-                                  or {}).get("totalCount", 0)
-                interactions = issue_comments + review_threads
-                review_nodes = ((node.get("reviews") or {}).get("nodes") or [])
-                if review_nodes:
-                    final_state = _compute_final_review_state(review_nodes)
-                else:
-                    final_state = "MERGED" if node.get("merged") else "CLOSED"
-
-                repo_prs.append([
-                    node["number"],
-                    node.get("title") or "",
-                    (node.get("author") or {}).get("login", "unknown"),
-                    node["createdAt"],
-                    closed_or_merged.isoformat(),
-                    reviews_total,
-                    hours,
-                    bool(node.get("merged")),
-                    additions,
-                    deletions,
-                    changed_files,
-                    body_len,
-                    issue_comments,
-                    review_threads,
-                    interactions,
-                    final_state,
-                ])
-                if max_prs and len(repo_prs) >= max_prs:
+                page_rows.append(row)
+                if max_prs and writer.rows + len(page_rows) >= max_prs:
+                    finished = True
                     break
 
             pbar_prs.update(len(pr_nodes))
 
-            if max_prs and len(repo_prs) >= max_prs:
+            page_info = pr_container["pageInfo"]
+            lane["endCursor"] = page_info["endCursor"]
+            lane["done"] = finished or not page_info["hasNextPage"]
+            writer.write_page(page_rows, discarded)
+
+    return writer.finalize()
+
+
+def _sync_state_path(repo_name: str) -> str:
+    sync_dir = os.path.join(OUTPUT_DIR, ".sync")
+    os.makedirs(sync_dir, exist_ok=True)
+    return os.path.join(sync_dir, f"{repo_name.replace('/', '_')}.json")
+
+
+def _load_last_updated_at(repo_name: str) -> Optional[float]:
+    """Marca d'água da última coleta: updatedAt mais recente já armazenado (ou o maior closedOrMergedAt do CSV)."""
+    state_path = _sync_state_path(repo_name)
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            return _parse_github_timestamp(json.load(f)["lastUpdatedAt"])
+
+    filename = _repo_csv_path(repo_name)
+    newest = None
+    with open(filename, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            closed = _parse_github_timestamp(row["closedOrMergedAt"])
+            newest = closed if newest is None else max(newest, closed)
+    return newest
+
+
+def _save_last_updated_at(repo_name: str, last_updated_at: str):
+    state_path = _sync_state_path(repo_name)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"repository": repo_name,
+                   "lastUpdatedAt": last_updated_at}, f)
+    os.replace(tmp_path, state_path)
+
+
+def upsert_repo_csv(repo_name: str, changed_rows: dict) -> int:
+    """Substitui/insere no CSV do repositório as linhas de changed_rows (número -> linha), com os PRs novos no topo."""
+    _check_lease()
+    filename = _repo_csv_path(repo_name)
+    tmp_filename = os.path.join(
+        OUTPUT_DIR, f".{repo_name.replace('/', '_')}.csv.tmp")
+    pending = dict(changed_rows)
+
+    with open(filename, "r", newline="", encoding="utf-8") as src:
+        reader = csv.reader(src)
+        next(reader, None)
+        existing = {int(row[0]) for row in reader}
+    new_numbers = sorted(
+        (number for number in pending if number not in existing), reverse=True)
+
+    with open(filename, "r", newline="", encoding="utf-8") as src, \
+            open(tmp_filename, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        writer.writerow(CSV_HEADER)
+        next(reader, None)
+        writer.writerows(pending.pop(number) for number in new_numbers)
+        for row in reader:
+            # CSVs gravados antes de novas colunas são completados com vazios
+            row = row + [""] * (len(CSV_HEADER) - len(row))
+            writer.writerow(pending.pop(int(row[0]), row))
+    os.replace(tmp_filename, filename)
+    publish_repo_dataset(repo_name)
+    return len(changed_rows)
+
+
+def collect_repo_delta(owner: str, name: str, prs_query_text: str) -> int:
+    """Atualiza o CSV de um repositório com os PRs criados ou alterados desde a última coleta."""
+    repo_name = f"{owner}/{name}"
+    since = _load_last_updated_at(repo_name)
+    newest_raw = None
+    changed_rows = {}
+    after_pr = None
+    page_size = AdaptivePageSize(initial=PR_PAGE_SIZE)
+    started = time.monotonic()
+
+    while True:
+        prs_data = run_query(prs_query_text, {
+            "owner": owner, "name": name, "after": after_pr,
+            "field": "UPDATED_AT", "direction": "DESC"}, page_size=page_size)
+        pr_container = prs_data["data"]["repository"]["pullRequests"]
+
+        reached_watermark = False
+        kept = discarded = 0
+        pr_nodes = _extract_pr_nodes(pr_container)
+        for node, row in zip(pr_nodes, transform_pr_page(pr_nodes)):
+            if since is not None and _parse_github_timestamp(node["updatedAt"]) <= since:
+                reached_watermark = True
                 break
+            if newest_raw is None:
+                newest_raw = node["updatedAt"]
+
+            if row is None:
+                discarded += 1
+            else:
+                changed_rows[row[0]] = row
+                kept += 1
+
+        if METRICS is not None:
+            METRICS.record_page(repo_name, kept, discarded)
+        page_info = pr_container["pageInfo"]
+        if reached_watermark or not page_info["hasNextPage"]:
+            break
+        after_pr = page_info["endCursor"]
+
+    upsert_repo_csv(repo_name, changed_rows)
+    if newest_raw is not None:
+        _save_last_updated_at(repo_name, newest_raw)
+    if METRICS is not None:
+        METRICS.record_repository(repo_name, "delta", time.monotonic() - started)
+    print(f"🔄 {repo_name}: {len(changed_rows)} PRs novos ou alterados")
+    return len(changed_rows)
+
+
+PR_DETAILS_CACHE_DIR = os.path.join(SCRIPT_DIR, ".cache", "pr_details")
+
+
+def _pr_details_cache_path(repo_name: str) -> str:
+    os.makedirs(PR_DETAILS_CACHE_DIR, exist_ok=True)
+    return os.path.join(PR_DETAILS_CACHE_DIR, f"{repo_name.replace('/', '_')}.jsonl")
+
+
+def _load_pr_details(repo_name: str) -> dict:
+    """Detalhes já buscados dos PRs do repositório (ID do nó -> detalhes)."""
+    details = {}
+    path = _pr_details_cache_path(repo_name)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Linha incompleta de uma execução interrompida
+                    continue
+                details[entry["id"]] = entry
+    return details
+
+
+def _summarize_pr_details(node: dict) -> dict:
+    """Estado da última revisão, revisores e horas até a primeira resposta de outra pessoa."""
+    author = (node.get("author") or {}).get("login")
+    reviews = (node.get("reviews") or {}).get("nodes") or []
+    comments = (node.get("comments") or {}).get("nodes") or []
+
+    reviewers = []
+    for review in reviews:
+        login = (review.get("author") or {}).get("login")
+        if login and login != author and login not in reviewers:
+            reviewers.append(login)
+
+    responses = [review.get("submittedAt") for review in reviews
+                 if (review.get("author") or {}).get("login") != author]
+    responses += [comment.get("createdAt") for comment in comments
+                  if (comment.get("author") or {}).get("login") != author]
+    responses = [value for value in responses if value]
+    first_response_hours = None
+    if responses:
+        first_response_hours = round(
+            (_parse_github_timestamp(min(responses)) - _parse_github_timestamp(node["createdAt"])) / 3600, 2)
+
+    last_review = ((node.get("lastReview") or {}).get("nodes") or [])
+    return {
+        "id": node["id"],
+        "finalReviewState": _compute_final_review_state(last_review) if last_review else None,
+        "reviewers": reviewers,
+        "firstResponseHours": first_response_hours,
+    }
+
+
+def enrich_repo_csv(repo_name: str) -> int:
+    """Completa o CSV de um repositório com detalhes por PR buscados via nodes(ids:); retorna quantos PRs foram buscados."""
+    filename = _repo_csv_path(repo_name)
+    with open(filename, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if "nodeId" not in header:
+        print(f"⚠️ {repo_name}: CSV sem a coluna nodeId (coletado por uma versão anterior); "
+              f"colete o repositório de novo para enriquecê-lo.")
+        return 0
+
+    details = _load_pr_details(repo_name)
+    with open(filename, "r", newline="", encoding="utf-8") as f:
+        missing = [row["nodeId"] for row in csv.DictReader(f)
+                   if row["nodeId"] and row["nodeId"] not in details]
+
+    query = load_query(PR_DETAILS_QUERY_FILE)
+    with open(_pr_details_cache_path(repo_name), "a", encoding="utf-8") as cache, \
+            tqdm(total=len(missing), desc=f"Detalhes {repo_name}", unit="pr", leave=False) as pbar:
+        for i in range(0, len(missing), DETAILS_BATCH_SIZE):
+            batch = missing[i:i + DETAILS_BATCH_SIZE]
+            data = run_query(query, {"ids": batch})
+            for node in data["data"]["nodes"]:
+                if not node:
+                    continue
+                entry = _summarize_pr_details(node)
+                details[entry["id"]] = entry
+                cache.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            cache.flush()
+            pbar.update(len(batch))
+
+    tmp_filename = os.path.join(
+        OUTPUT_DIR, f".{repo_name.replace('/', '_')}.csv.tmp")
+    with open(filename, "r", newline="", encoding="utf-8") as src, \
+            open(tmp_filename, "w", newline="", encoding="utf-8") as dst:
+        writer = csv.DictWriter(dst, fieldnames=CSV_HEADER, restval="", extrasaction="ignore")
+        writer.writeheader()
+        for row in csv.DictReader(src):
+            entry = details.get(row["nodeId"])
+            if entry is not None:
+                if entry["finalReviewState"]:
+                    row["finalReviewState"] = entry["finalReviewState"]
+                row["reviewers"] = ";".join(entry["reviewers"])
+                row["firstResponseHours"] = "" if entry["firstResponseHours"] is None \
+                    else entry["firstResponseHours"]
+            writer.writerow(row)
+    os.replace(tmp_filename, filename)
+    publish_repo_dataset(repo_name)
+    print(f"🔎 {repo_name}: {len(missing)} PRs enriquecidos pela API")
+    return len(missing)
+
+
+def run_enrichment(repo: Optional[str] = None):
+    """Enriquece o CSV de `repo` (owner/name) ou de todos os repositórios já coletados."""
+    if repo:
+        repo_names = [repo]
+    else:
+        # O nome do arquivo troca "/" por "_"; o dono vem do primeiro "_"
+        repo_names = [stem.replace("_", "/", 1) for stem in sorted(_list_processed_repos())]
+    for repo_name in tqdm(repo_names, desc="Enriquecendo repositórios", unit="repos"):
+        enrich_repo_csv(repo_name)
+
+
+def _pr_search_string(owner: str, name: str, start: datetime.datetime, end: datetime.datetime) -> str:
+    """Qualificadores da busca: só PRs fechados/mergeados com ao menos uma revisão."""
+    fmt = "%Y-%m-%dT%H:%M:%SZ"
+    return (f"repo:{owner}/{name} is:pr is:closed -review:none "
+            f"created:{start.strftime(fmt)}..{end.strftime(fmt)} sort:created-desc")
+
+
+def split_search_ranges(owner: str, name: str, start: datetime.datetime,
+                        end: datetime.datetime, count_query: str) -> List[list]:
+    """Divide [start, end] em intervalos de criação com até SEARCH_RESULT_CAP PRs cada, do mais recente para o mais antigo."""
+    data = run_query(count_query, {"q": _pr_search_string(owner, name, start, end)})
+    count = data["data"]["search"]["issueCount"]
+    if count == 0:
+        return []
+    if count <= SEARCH_RESULT_CAP:
+        return [[start.isoformat(), end.isoformat()]]
+    if (end - start).total_seconds() < 2:
+        print(
+            f"⚠️ {owner}/{name}: {count} PRs criados em {start.isoformat()}; só os primeiros {SEARCH_RESULT_CAP} serão coletados.")
+        return [[start.isoformat(), end.isoformat()]]
+
+    middle = start + (end - start) / 2
+    middle = middle.replace(microsecond=0)
+    newer = split_search_ranges(
+        owner, name, middle + datetime.timedelta(seconds=1), end, count_query)
+    older = split_search_ranges(owner, name, start, middle, count_query)
+    return newer + older
+
+
+def collect_repo_prs_search(owner: str, name: str, max_prs: Optional[int] = None) -> int:
+    """Coleta PRs de um repositório pela conexão search, com o filtro de revisão feito no servidor."""
+    search_query = load_query(PR_SEARCH_QUERY_FILE)
+    writer = RepoCSVWriter(f"{owner}/{name}", mode="search")
+    lane = writer.lanes.get("SEARCH")
+    if lane is None:
+        # Fim do dia corrente (UTC): as consultas, e as chaves do cache de
+        # respostas, ficam iguais entre execuções do mesmo dia
+        today = datetime.datetime.now(datetime.timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        ranges = split_search_ranges(
+            owner, name, SEARCH_START_DATE,
+            today + datetime.timedelta(days=1, seconds=-1),
+            load_query(PR_SEARCH_COUNT_QUERY_FILE))
+        lane = writer.lane("SEARCH")
+        lane["ranges"] = ranges
+        lane["done"] = not ranges
+
+    page_size = AdaptivePageSize(initial=PR_PAGE_SIZE)
+    with tqdm(desc=f"PRs {owner}/{name} (busca)", unit="pr", initial=writer.rows, leave=False) as pbar_prs:
+        while not writer.done and not (max_prs and writer.rows >= max_prs):
+            start, end = (datetime.datetime.fromisoformat(value)
+                          for value in lane["ranges"][0])
+            data = run_query(search_query, {
+                "q": _pr_search_string(owner, name, start, end),
+                "after": lane["endCursor"]}, page_size=page_size)
+            search = data["data"]["search"]
+
+            page_rows = []
+            discarded = 0
+            # Resultados que não são PRs chegam como objetos vazios
+            pr_nodes = [node for node in search["nodes"] if node]
+            for row in transform_pr_page(pr_nodes):
+                if row is None:
+                    discarded += 1
+                    continue
+                page_rows.append(row)
+                if max_prs and writer.rows + len(page_rows) >= max_prs:
+                    lane["done"] = True
+                    break
+            pbar_prs.update(len(page_rows))
+
+            if search["pageInfo"]["hasNextPage"]:
+                lane["endCursor"] = search["pageInfo"]["endCursor"]
+            else:
+                lane["ranges"].pop(0)
+                lane["endCursor"] = None
+                lane["done"] = lane["done"] or not lane["ranges"]
+            writer.write_page(page_rows, discarded)
+
+    return writer.finalize()
+
+
+async def collect_repo_prs_async(owner: str, name: str, repo_node: dict, prs_query_text: str,
+                                 request_slots: asyncio.Semaphore, max_prs: Optional[int] = None,
+                                 first_page: Optional[dict] = None) -> int:
+    """Coleta PRs de um repositório com duas frentes de cursor simultâneas (DESC e ASC) que param ao se cruzar."""
+    writer = RepoCSVWriter(f"{owner}/{name}")
+    lanes = writer.lanes
+    if not lanes:
+        pr_total = repo_node["pullRequests"]["totalCount"]
+        directions = ["DESC"] if max_prs or pr_total <= 100 else ["DESC", "ASC"]
+        for direction in directions:
+            writer.lane(direction)
+
+    async def walk(direction: str):
+        nonlocal first_page
+        lane = lanes[direction]
+        page_size = AdaptivePageSize(initial=PR_PAGE_SIZE)
+        while not writer.done and not (max_prs and writer.rows >= max_prs):
+            if direction == "DESC" and first_page is not None and lane["endCursor"] is None:
+                pr_container, first_page = first_page, None
+            else:
+                async with request_slots:
+                    prs_data = await asyncio.to_thread(
+                        run_query, prs_query_text,
+                        {"owner": owner, "name": name, "after": lane["endCursor"], "direction": direction},
+                        page_size=page_size)
+                pr_container = prs_data["data"]["repository"]["pullRequests"]
+
+            page_rows = []
+            discarded = 0
+            finished = False
+            pr_nodes = _extract_pr_nodes(pr_container)
+            for node, row in zip(pr_nodes, transform_pr_page(pr_nodes)):
+                if _lane_crossed(lanes, direction, node["number"]):
+                    finished = True
+                    break
+                lane["frontier"] = node["number"]
+
+                if row is None:
+                    discarded += 1
+                    continue
+
+                page_rows.append(row)
+                if max_prs and writer.rows + len(page_rows) >= max_prs:
+                    finished = True
+                    break
 
             page_info = pr_container["pageInfo"]
-            if page_info["hasNextPage"]:
-                after_pr = page_info["endCursor"]
+            lane["endCursor"] = page_info["endCursor"]
+            lane["done"] = finished or not page_info["hasNextPage"]
+            writer.write_page(page_rows, discarded)
+
+    await asyncio.gather(*(walk(direction) for direction in list(lanes)))
+    return await asyncio.to_thread(writer.finalize)
+
+
+async def _run_multi_repo_async(max_prs: Optional[int], concurrency: int, since_last_run: bool,
+                                use_search: bool, max_repos: int = MAX_REPOS):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+
+    start_time = time.time()
+    prs_collected = 0
+    request_slots = asyncio.Semaphore(concurrency)
+    repo_slots = asyncio.Semaphore(concurrency)
+    tasks = []
+
+    processed_repos = _list_processed_repos()
+    repo_batches = _repo_batches(max_repos)
+
+    prs_query_text = load_query(PRS_QUERY_FILE)
+
+    async def process_repo(owner: str, name: str, repo_node: dict, pbar_repos, delta: bool,
+                           first_page: Optional[dict]):
+        nonlocal prs_collected
+        try:
+            if delta:
+                repo_total = await asyncio.to_thread(
+                    collect_repo_delta, owner, name, prs_query_text)
+            elif use_search:
+                repo_total = await asyncio.to_thread(
+                    collect_repo_prs_search, owner, name, max_prs)
             else:
-                break
+                repo_total = await collect_repo_prs_async(
+                    owner, name, repo_node, prs_query_text, request_slots, max_prs=max_prs,
+                    first_page=first_page)
+            prs_collected += repo_total
+        finally:
+            repo_slots.release()
+            pbar_repos.update(1)
+
+    with tqdm(total=max_repos, desc="Processando repositórios", unit="repos") as pbar_repos:
+        while True:
+            async with request_slots:
+                repo_nodes = await asyncio.to_thread(next, repo_batches, None)
+                if repo_nodes is None:
+                    break
+                first_pages = {} if use_search else await asyncio.to_thread(
+                    _prefetch_first_pages, repo_nodes, processed_repos)
+
+            for repo_node in repo_nodes:
+                owner = repo_node["owner"]["login"]
+                name = repo_node["name"]
+                repo_name = f"{owner}/{name}"
+
+                already_processed = repo_name.replace("/", "_") in processed_repos
+                if already_processed and not since_last_run:
+                    print(f"⏭️ Pulando {repo_name}, já processado.")
+                    pbar_repos.update(1)
+                else:
+                    await repo_slots.acquire()
+                    tasks.append(asyncio.create_task(
+                        process_repo(owner, name, repo_node, pbar_repos, already_processed,
+                                     first_pages.get(repo_name))))
+
+        await asyncio.gather(*tasks)
+
+    elapsed_min = (time.time() - start_time) / 60
+    throughput = prs_collected / elapsed_min if elapsed_min > 0 else 0
+    print(
+        f"\n✅ Tempo total de execução (multi-repo, concorrência {concurrency}): "
+        f"{round(elapsed_min, 2)} minutos — {prs_collected} PRs ({throughput:.0f} PRs/min)")
+
+
+def run_async_multi_repo_mode(max_prs: Optional[int], concurrency: int, since_last_run: bool = False,
+                              use_search: bool = False, max_repos: int = MAX_REPOS):
+    """Varre os repositórios populares mantendo até `concurrency` requisições em andamento."""
+    asyncio.run(_run_multi_repo_async(
+        max_prs, concurrency, since_last_run, use_search, max_repos))
+
 
-    return repo_prs
+DEFAULT_QUEUE_FILE = os.path.join(SCRIPT_DIR, ".queue", "repos.sqlite")
+# Intervalo máximo entre novas tentativas de um worker sem trabalho disponível
+QUEUE_POLL_SECONDS = 30
+# Sinalizado por _renew_lease quando o repositório em coleta passa para outro worker
+LEASE_LOST = threading.Event()
+
+
+class LeaseLost(Exception):
+    """A concessão do repositório em coleta passou para outro worker."""
+
+
+def _check_lease():
+    if LEASE_LOST.is_set():
+        raise LeaseLost("concessão perdida para outro worker")
+
+
+def enqueue_repos(queue_path: str, max_repos: int = MAX_REPOS) -> int:
+    """Coordenador: grava na fila os mesmos repositórios que o modo multi-repo varre."""
+    queue = WorkQueue(queue_path)
+    added = 0
+    for repo_nodes in _repo_batches(max_repos):
+        added += queue.enqueue(repo_nodes)
+
+    print(f"📥 {added} repositórios adicionados à fila {queue_path} — {queue.counts()}")
+    queue.close()
+    return added
+
+
+def _renew_lease(queue: WorkQueue, repo_name: str, worker: str, stop: threading.Event):
+    while not stop.wait(queue.lease_seconds / 3):
+        if not queue.renew(repo_name, worker):
+            print(f"⚠️ Concessão de {repo_name} perdida por {worker}, abandonando a coleta.")
+            LEASE_LOST.set()
+            return
+
+
+def run_queue_worker(queue_path: str, max_prs: Optional[int], since_last_run: bool = False,
+                     use_search: bool = False, lease_seconds: float = 600) -> int:
+    """Worker: pega repositórios da fila, um por vez, até não haver nada pendente nem em andamento."""
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    prs_query_text = load_query(PRS_QUERY_FILE)
+    prs_collected = 0
+
+    while True:
+        repo_node = queue.claim(worker)
+        if repo_node is None:
+            expiry = queue.next_lease_expiry()
+            if expiry is None:
+                break
+            # Outro worker ainda coleta: espera a concessão vencer (se ele cair,
+            # este worker retoma o repositório) ou ele terminar
+            time.sleep(min(max(expiry - time.time(), 0) + 0.1, QUEUE_POLL_SECONDS))
+            continue
+        owner, name = repo_node["owner"]["login"], repo_node["name"]
+        repo_name = f"{owner}/{name}"
+        already_processed = f"{owner}_{name}" in _list_processed_repos()
+
+        stop = threading.Event()
+        LEASE_LOST.clear()
+        heartbeat = threading.Thread(
+            target=_renew_lease, args=(queue, repo_name, worker, stop), daemon=True)
+        heartbeat.start()
+        try:
+            if already_processed and not since_last_run:
+                print(f"⏭️ Pulando {repo_name}, já processado.")
+                repo_total = 0
+            elif already_processed:
+                repo_total = collect_repo_delta(owner, name, prs_query_text)
+            elif use_search:
+                repo_total = collect_repo_prs_search(owner, name, max_prs=max_prs)
+            else:
+                repo_total = collect_repo_prs(
+                    owner, name, repo_node, prs_query_text, max_prs=max_prs)
+        except (CacheMiss, KeyboardInterrupt):
+            queue.fail(repo_name, worker, "interrompido")
+            raise
+        except LeaseLost:
+            # O checkpoint e o CSV agora são do outro worker: nada é gravado nem marcado na fila
+            continue
+        except Exception as e:
+            print(f"❌ Falha ao coletar {repo_name}: {e}")
+            queue.fail(repo_name, worker, repr(e))
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        queue.complete(repo_name, worker, repo_total)
+        prs_collected += repo_total
+
+    print(f"🏁 Worker {worker} sem trabalho na fila — {prs_collected} PRs coletados; "
+          f"fila: {queue.counts()}")
+    queue.close()
+    return prs_collected
+
+
+def _queue_worker_process(cache_settings: Optional[tuple], metrics_dir: Optional[str],
+                          dataset_format: str, database_path: Optional[str], *args):
+    """Ponto de entrada dos processos worker: reaplica o cache, as métricas e o destino do dataset do processo pai."""
+    global RESPONSE_CACHE, DATASET_FORMAT
+    DATASET_FORMAT = dataset_format
+    if database_path is not None:
+        configure_database(database_path)
+    if cache_settings is not None:
+        directory, ttl_seconds, max_bytes, replay = cache_settings
+        RESPONSE_CACHE = ResponseCache(directory, ttl_seconds, max_bytes, replay)
+    if metrics_dir is not None:
+        # Um textfile por processo: o node_exporter junta todos os *.prom do diretório
+        configure_metrics(metrics_dir, f"collector-{os.getpid()}.prom")
+    try:
+        run_queue_worker(*args)
+        print_run_summary()
+    finally:
+        if METRICS is not None:
+            METRICS.close()
+
+
+def run_queue_workers(queue_path: str, workers: int, max_prs: Optional[int], since_last_run: bool = False,
+                      use_search: bool = False, lease_seconds: float = 600):
+    """Sobe `workers` processos locais consumindo a mesma fila."""
+    if workers <= 1:
+        run_queue_worker(queue_path, max_prs, since_last_run, use_search, lease_seconds)
+        return
+
+    cache_settings = None
+    if RESPONSE_CACHE is not None:
+        cache_settings = (RESPONSE_CACHE.directory, RESPONSE_CACHE.ttl_seconds,
+                          RESPONSE_CACHE.max_bytes, RESPONSE_CACHE.replay)
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_queue_worker_process,
+                             args=(cache_settings, METRICS.directory if METRICS else None,
+                                   DATASET_FORMAT, DATABASE.path if DATABASE else None,
+                                   queue_path, max_prs, since_last_run, use_search, lease_seconds))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def print_run_summary():
+    """Resumo do fim da execução: orçamento de cada token e acertos e faltas do cache de respostas."""
+    if len(TOKEN_POOL.limiters) > 1:
+        for entry in TOKEN_POOL.summary():
+            remaining = "desconhecido" if entry["remaining"] is None else f"{entry['remaining']} pontos"
+            print(f"🔑 Token {entry['token']}: {remaining}")
+    if RESPONSE_CACHE is not None:
+        print(f"🗄️ Cache de respostas: {RESPONSE_CACHE.hits} acertos, {RESPONSE_CACHE.misses} faltas")
 
 
 def main():
+    global DATASET_FORMAT
     parser = argparse.ArgumentParser(
         description="Coletor de PRs via GitHub GraphQL")
     parser.add_argument(
         "--repo", help="Repositório único no formato owner/name para teste")
     parser.add_argument("--max-prs", type=int, default=None,
                         help="Limite de PRs ao coletar um único repositório")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requisições simultâneas no modo multi-repo (1 = sequencial)")
+    parser.add_argument("--since-last-run", action="store_true",
+                        help="Atualiza os CSVs existentes só com PRs novos ou alterados desde a última coleta")
+    parser.add_argument("--search", action="store_true",
+                        help="Coleta pela busca (is:pr is:closed -review:none), sem baixar PRs sem revisão")
+    parser.add_argument("--cache", action="store_true",
+                        help="Guarda as respostas da API em disco e as reutiliza nas próximas execuções")
+    parser.add_argument("--replay", action="store_true",
+                        help="Usa apenas respostas do cache, sem acessar a API (falha se faltar alguma)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Diretório do cache de respostas")
+    parser.add_argument("--cache-ttl", type=float, default=None,
+                        help="Validade das respostas em cache, em horas (padrão: sem expiração; primeiras "
+                             "páginas, buscas e --since-last-run sempre vão à API, exceto com --replay)")
+    parser.add_argument("--cache-max-mb", type=float, default=2048,
+                        help="Tamanho máximo do cache em MB")
+    parser.add_argument("--metrics", nargs="?", const=DEFAULT_METRICS_DIR, default=None,
+                        help="Grava métricas por requisição e por repositório (JSON lines + textfile "
+                             "do Prometheus) neste diretório (padrão: metrics/)")
+    parser.add_argument("--enrich", action="store_true",
+                        help="Completa os CSVs já coletados (ou o de --repo) com a última revisão, "
+                             "os revisores e o tempo até a primeira resposta de cada PR")
+    parser.add_argument("--format", choices=DATASET_FORMATS, default=DATASET_FORMAT,
+                        help="Formato do dataset final: CSV em datasets/, Parquet particionado por "
+                             "repositório em datasets_parquet/ ou ambos (padrão: both)")
+    parser.add_argument("--database", nargs="?", const=DEFAULT_DATABASE_FILE, default=None,
+                        help="Também grava cada repositório, por upsert em (repositório, número), "
+                             "nesta base SQLite (padrão: datasets.sqlite)")
+    parser.add_argument("--discover", action="store_true",
+                        help="Só lista os repositórios e grava o manifesto usado pelas coletas seguintes")
+    parser.add_argument("--min-stars", type=int, default=DISCOVERY_MIN_STARS,
+                        help="Com --discover: mínimo de estrelas dos repositórios")
+    parser.add_argument("--max-repos", type=int, default=None,
+                        help=f"Quantidade de repositórios coletados (padrão: {MAX_REPOS}) "
+                             "ou listados com --discover (padrão: todos)")
+    parser.add_argument("--queue", nargs="?", const=DEFAULT_QUEUE_FILE, default=None,
+                        help="Coleta pela fila SQLite compartilhada (por padrão .queue/repos.sqlite)")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Com --queue: só preenche a fila com os repositórios (coordenador)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Com --queue: quantidade de processos worker nesta máquina")
+    parser.add_argument("--lease", type=float, default=600,
+                        help="Com --queue: validade da concessão de um repositório, em segundos")
     args = parser.parse_args()
-
-    if args.repo:
-        run_single_repo_mode(args.repo, args.max_prs)
+    max_repos = args.max_repos or MAX_REPOS
+    DATASET_FORMAT = args.format
+
+    if args.cache or args.replay:
+        configure_cache(args.cache_dir, args.cache_ttl,
+                        args.cache_max_mb, args.replay)
+
+    if args.metrics:
+        configure_metrics(args.metrics)
+
+    if args.database:
+        configure_database(args.database)
+
+    if args.enrich:
+        run_enrichment(args.repo)
+    elif args.discover:
+        discover_repos(args.min_stars, args.max_repos)
+    elif args.queue and args.enqueue:
+        enqueue_repos(args.queue, max_repos)
+    elif args.queue:
+        run_queue_workers(args.queue, args.workers, args.max_prs,
+                          args.since_last_run, args.search, args.lease)
+    elif args.repo:
+        run_single_repo_mode(args.repo, args.max_prs,
+                             args.since_last_run, args.search)
+    elif args.concurrency > 1:
+        run_async_multi_repo_mode(
+            args.max_prs, args.concurrency, args.since_last_run, args.search, max_repos)
     else:
-        run_multi_repo_mode(args.max_prs)
+        run_multi_repo_mode(args.max_prs, args.since_last_run,
+                            args.search, max_repos)
+
+    print_run_summary()
+    if METRICS is not None:
+        METRICS.close()
+    if DATABASE is not None:
+        DATABASE.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import dataset_store
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, ".cache", "combined")
+CACHE_FILE = "prs.arrow"
+MANIFEST_FILE = "manifest.json"
+
+CACHE_SCHEMA = dataset_store.PR_SCHEMA.append(pa.field("repository", pa.string()))
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _load_manifest(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(cache_dir: str, sources: dict):
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"sources": sources}, f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+def _open_cache(cache_dir: str):
+    """Abre o arquivo Arrow do cache mapeado em memória, ou None se ele não existir ou tiver outro esquema."""
+    path = os.path.join(cache_dir, CACHE_FILE)
+    if not os.path.exists(path):
+        return None
+    reader = ipc.open_file(pa.memory_map(path, "r"))
+    return reader if reader.schema.equals(CACHE_SCHEMA) else None
+
+
+def _parse_repository(csv_file: str) -> List[pa.RecordBatch]:
+    repository = os.path.basename(csv_file)[:-len(".csv")]
+    table = dataset_store.read_csv_table(csv_file)
+    table = table.append_column("repository", pa.array([repository] * table.num_rows, pa.string()))
+    return table.combine_chunks().to_batches()
+
+
+def load_combined(csv_files: List[str], cache_dir: str = DEFAULT_CACHE_DIR,
+                  workers: Optional[int] = None) -> pa.Table:
+    """Dataset combinado de `csv_files` servido do cache Arrow IPC; só os CSVs novos ou alterados são relidos (em `workers` threads)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    reader = _open_cache(cache_dir)
+    sources = _load_manifest(cache_dir).get("sources", {}) if reader is not None else {}
+
+    entries, changed = {}, []
+    for csv_file in sorted(csv_files):
+        repository = os.path.basename(csv_file)[:-len(".csv")]
+        stat = os.stat(csv_file)
+        entry = sources.get(repository)
+        if entry is not None and entry["size"] == stat.st_size:
+            if entry["mtime_ns"] == stat.st_mtime_ns or entry["sha256"] == _file_hash(csv_file):
+                entries[repository] = dict(entry, path=os.path.abspath(csv_file),
+                                           mtime_ns=stat.st_mtime_ns)
+                continue
+        entries[repository] = {"path": os.path.abspath(csv_file), "size": stat.st_size,
+                               "mtime_ns": stat.st_mtime_ns, "sha256": _file_hash(csv_file)}
+        changed.append((repository, csv_file))
+
+    if reader is not None and not changed and list(entries) == list(sources):
+        if entries != sources:
+            _write_manifest(cache_dir, entries)
+        return reader.read_all()
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        parsed = dict(zip((repository for repository, _ in changed),
+                          executor.map(lambda job: _parse_repository(job[1]), changed)))
+
+    cache_path = os.path.join(cache_dir, CACHE_FILE)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with ipc.new_file(tmp_path, CACHE_SCHEMA) as writer:
+        position = 0
+        for repository, entry in entries.items():
+            if repository in parsed:
+                batches = parsed[repository]
+            else:
+                batches = [reader.get_batch(i) for i in entry["batches"]]
+            for batch in batches:
+                writer.write_batch(batch)
+            entry["batches"] = list(range(position, position + len(batches)))
+            position += len(batches)
+    os.replace(tmp_path, cache_path)
+    _write_manifest(cache_dir, entries)
+
+    print(f"🗃️ Cache do dataset combinado: {len(changed)} repositórios lidos dos CSVs, "
+          f"{len(entries) - len(changed)} reaproveitados")
+    return _open_cache(cache_dir).read_all()
@@ -0,0 +1,146 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_DIR = os.path.join(SCRIPT_DIR, "datasets_parquet")
+
+# Esquema fixo do dataset; mesma ordem de colunas do CSV_HEADER do coletor
+PR_SCHEMA = pa.schema([
+    ("number", pa.int32()),
+    ("title", pa.string()),
+    ("author", pa.string()),
+    ("createdAt", pa.timestamp("s", tz="UTC")),
+    ("closedOrMergedAt", pa.timestamp("s", tz="UTC")),
+    ("reviewsCount", pa.int32()),
+    ("hoursOpen", pa.float64()),
+    ("merged", pa.bool_()),
+    ("additions", pa.int32()),
+    ("deletions", pa.int32()),
+    ("changedFiles", pa.int32()),
+    ("bodyLength", pa.int32()),
+    ("issueCommentsCount", pa.int32()),
+    ("reviewThreadsCount", pa.int32()),
+    ("interactionsCount", pa.int32()),
+    ("finalReviewState", pa.string()),
+    ("nodeId", pa.string()),
+    ("reviewers", pa.string()),
+    ("firstResponseHours", pa.float64()),
+])
+
+PARTITION_FILE = "part-0.parquet"
+
+
+def _partition_dir(stem: str, root: str = DEFAULT_STORE_DIR) -> str:
+    return os.path.join(root, f"repository={stem}")
+
+
+def partition_path(stem: str, root: str = DEFAULT_STORE_DIR) -> str:
+    """Arquivo Parquet do repositório `stem` (owner_name, como no nome do CSV)."""
+    return os.path.join(_partition_dir(stem, root), PARTITION_FILE)
+
+
+def list_partitions(root: str = DEFAULT_STORE_DIR) -> List[str]:
+    """Repositórios (owner_name) com partição no dataset."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name[len("repository="):] for name in os.listdir(root)
+                  if name.startswith("repository=")
+                  and os.path.exists(os.path.join(root, name, PARTITION_FILE)))
+
+
+def read_csv_table(csv_path: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """Lê o CSV de um repositório no esquema fixo (só com `columns`, se informadas); colunas ausentes viram nulos."""
+    schema = PR_SCHEMA if columns is None else pa.schema([PR_SCHEMA.field(name) for name in columns])
+    table = pacsv.read_csv(csv_path, convert_options=pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in schema},
+        include_columns=schema.names, include_missing_columns=True))
+    return table.cast(schema)
+
+
+def write_partition(stem: str, csv_path: str, root: str = DEFAULT_STORE_DIR) -> str:
+    """Converte o CSV de um repositório e substitui sua partição de forma atômica."""
+    path = partition_path(stem, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(read_csv_table(csv_path), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _csv_value(name: str, value):
+    if value is None:
+        return ""
+    if name == "createdAt":
+        return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if name == "closedOrMergedAt":
+        return value.isoformat()
+    return value
+
+
+def export_csv(stem: str, csv_path: str, root: str = DEFAULT_STORE_DIR):
+    """Regrava a partição de um repositório no formato de CSV do coletor."""
+    table = pq.read_table(partition_path(stem, root), schema=PR_SCHEMA)
+    tmp_path = f"{csv_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(PR_SCHEMA.names)
+        for batch in table.to_batches():
+            columns = batch.to_pydict()
+            writer.writerows(
+                [_csv_value(name, columns[name][i]) for name in PR_SCHEMA.names]
+                for i in range(batch.num_rows))
+    os.replace(tmp_path, csv_path)
+
+
+def build_store(input_folder: str, root: str = DEFAULT_STORE_DIR, workers: Optional[int] = None) -> int:
+    """Converte em `workers` threads os CSVs de `input_folder` cuja partição falta ou é mais antiga que o CSV."""
+    pending = []
+    for csv_file in sorted(glob(os.path.join(input_folder, "*.csv"))):
+        stem = os.path.basename(csv_file)[:-len(".csv")]
+        path = partition_path(stem, root)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_file):
+            continue
+        pending.append((stem, csv_file))
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        list(executor.map(lambda job: write_partition(job[0], job[1], root), pending))
+    return len(pending)
+
+
+def load_dataset(root: str = DEFAULT_STORE_DIR, columns: Optional[List[str]] = None,
+                 repositories: Optional[List[str]] = None):
+    """Lê o dataset como DataFrame, só com as colunas e partições pedidas; a coluna `repository` vem do nome da partição."""
+    dataset = ds.dataset(root, format="parquet", schema=PR_SCHEMA.append(
+        pa.field("repository", pa.string())), partitioning="hive")
+    if columns is not None:
+        columns = [name for name in columns if name != "repository"] + ["repository"]
+    row_filter = None
+    if repositories is not None:
+        row_filter = ds.field("repository").isin(list(repositories))
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converte os CSVs coletados para o dataset Parquet particionado por repositório")
+    parser.add_argument("--input", default=os.path.join(SCRIPT_DIR, "datasets"),
+                        help="Pasta com os CSVs (padrão: datasets/)")
+    parser.add_argument("--output", default=DEFAULT_STORE_DIR,
+                        help="Pasta do dataset Parquet (padrão: datasets_parquet/)")
+    args = parser.parse_args()
+
+    converted = build_store(args.input, args.output)
+    print(f"✅ {converted} repositórios convertidos; {len(list_partitions(args.output))} "
+          f"partições em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+
+def query_name(query: str) -> str:
+    """Nome da operação GraphQL (`query Nome(...)`), usado como rótulo das métricas."""
+    match = re.search(r"\b(?:query|mutation)\s+(\w+)", query)
+    return match.group(1) if match else "anonymous"
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRecorder:
+    """Grava cada requisição e repositório em collector_metrics.jsonl e os contadores agregados num textfile do Prometheus."""
+
+    def __init__(self, directory: str, prom_name: str = "collector.prom"):
+        self.directory = directory
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "collector_metrics.jsonl")
+        self.prom_path = os.path.join(directory, prom_name)
+        self._lock = threading.Lock()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+        self.requests = defaultdict(int)       # (query, status) -> requisições
+        self.retries = defaultdict(int)        # query -> tentativas repetidas
+        self.seconds = defaultdict(float)      # query -> tempo total, com retries e pausas
+        self.response_bytes = defaultdict(int)  # query -> bytes recebidos
+        self.cost = defaultdict(int)           # query -> pontos de rate limit
+        self.remaining = {}                    # token -> último orçamento visto
+        self.repo_pages = defaultdict(int)
+        self.repo_kept = defaultdict(int)
+        self.repo_discarded = defaultdict(int)
+        self.repo_seconds = {}
+        # Páginas, PRs mantidos e descartados da coleta em andamento de cada repositório
+        self._current = defaultdict(lambda: [0, 0, 0])
+
+    def _write(self, event: dict):
+        self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._log.flush()
+
+    def record_request(self, query: str, variables: dict, status, latency: float, retries: int,
+                       wall_seconds: Optional[float] = None, response_bytes: int = 0,
+                       cost: Optional[int] = None, remaining: Optional[int] = None, token: str = ""):
+        name = query_name(query)
+        owner, repo = (variables or {}).get("owner"), (variables or {}).get("name")
+        with self._lock:
+            self.requests[(name, str(status))] += 1
+            self.retries[name] += retries
+            self.seconds[name] += wall_seconds if wall_seconds is not None else latency
+            self.response_bytes[name] += response_bytes
+            self.cost[name] += cost or 0
+            if remaining is not None:
+                self.remaining[token] = remaining
+            self._write({
+                "type": "request", "time": time.time(), "process": self.process,
+                "query": name, "repository": f"{owner}/{repo}" if owner and repo else None,
+                "status": status, "latency": round(latency, 4), "retries": retries,
+                "wall_seconds": round(wall_seconds if wall_seconds is not None else latency, 4),
+                "bytes": response_bytes, "cost": cost, "remaining": remaining,
+            })
+
+    def record_page(self, repository: str, kept: int, discarded: int):
+        with self._lock:
+            self.repo_pages[repository] += 1
+            self.repo_kept[repository] += kept
+            self.repo_discarded[repository] += discarded
+            current = self._current[repository]
+            current[0] += 1
+            current[1] += kept
+            current[2] += discarded
+
+    def record_repository(self, repository: str, mode: str, seconds: float):
+        with self._lock:
+            self.repo_seconds[repository] = seconds
+            pages, kept, discarded = self._current.pop(repository, [0, 0, 0])
+            self._write({
+                "type": "repository", "time": time.time(), "process": self.process,
+                "repository": repository, "mode": mode, "pages": pages,
+                "prs_kept": kept, "prs_discarded": discarded, "seconds": round(seconds, 3),
+            })
+        self.flush()
+
+    def flush(self):
+        """Reescreve o textfile do Prometheus com os valores acumulados."""
+        with self._lock:
+            lines = []
+
+            def metric(name: str, kind: str, help_text: str, samples):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(process=self.process, **labels)} {value}")
+
+            metric("collector_graphql_requests_total", "counter", "Consultas GraphQL por status final.",
+                   [({"query": q, "status": s}, n) for (q, s), n in sorted(self.requests.items())])
+            metric("collector_graphql_retries_total", "counter", "Tentativas repetidas por consulta.",
+                   [({"query": q}, n) for q, n in sorted(self.retries.items())])
+            metric("collector_graphql_seconds_total", "counter",
+                   "Tempo gasto nas consultas (com retries e pausas), em segundos.",
+                   [({"query": q}, round(n, 4)) for q, n in sorted(self.seconds.items())])
+            metric("collector_graphql_response_bytes_total", "counter", "Bytes recebidos nas respostas.",
+                   [({"query": q}, n) for q, n in sorted(self.response_bytes.items())])
+            metric("collector_graphql_cost_total", "counter", "Pontos de rate limit gastos.",
+                   [({"query": q}, n) for q, n in sorted(self.cost.items())])
+            metric("collector_rate_limit_remaining", "gauge", "Último orçamento restante informado por token.",
+                   [({"token": f"...{t[-4:]}" if t else ""}, n) for t, n in sorted(self.remaining.items())])
+            metric("collector_repository_pages_total", "counter", "Páginas de PRs processadas por repositório.",
+                   [({"repository": r}, n) for r, n in sorted(self.repo_pages.items())])
+            metric("collector_repository_prs_total", "counter", "PRs mantidos e descartados pelos filtros.",
+                   [sample for r in sorted(self.repo_pages) for sample in (
+                       ({"repository": r, "result": "kept"}, self.repo_kept[r]),
+                       ({"repository": r, "result": "discarded"}, self.repo_discarded[r]))])
+            metric("collector_repository_seconds", "gauge", "Tempo de parede da coleta do repositório.",
+                   [({"repository": r}, round(n, 3)) for r, n in sorted(self.repo_seconds.items())])
+
+            tmp_path = f"{self.prom_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prom_path)
+
+    def close(self):
+        self.flush()
+        self._log.close()
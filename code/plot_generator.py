@@ -15,11 +15,11 @@ plt.rcParams['axes.labelsize'] = 11
 
 
 def load_data():
-    """Carrega os dados processados e resultados das análises"""
+    """Carrega os dados processados (Parquet gravado pelo analyzer) e resultados das análises"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     results_folder = os.path.join(script_dir, 'results')
 
-    df = pd.read_csv(os.path.join(results_folder, 'processed_data.csv'))
+    df = pd.read_parquet(os.path.join(results_folder, 'processed_data.parquet'))
 
     with open(os.path.join(results_folder, 'correlations.json'), 'r', encoding='utf-8') as f:
         correlations = json.load(f)
@@ -495,16 +495,8 @@ def plot_summary_dashboard(correlations, descriptive_stats, output_folder):
     plt.close()
 
 
-def main():
-    print("📊 Gerando visualizações das análises estatísticas...\n")
-
-    # Carregar dados
-    print("📁 Carregando dados...")
-    df, correlations, descriptive_stats = load_data()
-
-    # Criar pasta para gráficos
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    charts_folder = os.path.join(script_dir, '..', 'docs', 'charts')
+def generate_charts(df, correlations, descriptive_stats, charts_folder):
+    """Gera todos os gráficos a partir do DataFrame processado e dos resultados das análises"""
     os.makedirs(charts_folder, exist_ok=True)
 
     print(f"📂 Gráficos serão salvos em: {charts_folder}\n")
@@ -530,6 +522,20 @@ def main():
     print("   4. distributions.png - Distribuições das variáveis")
     print("   5. scatter_correlations.png - Scatter plots das principais correlações")
     print("   6. summary_dashboard.png - Dashboard resumido com todas as descobertas")
+
+
+def main():
+    print("📊 Gerando visualizações das análises estatísticas...\n")
+
+    # Carregar dados
+    print("📁 Carregando dados...")
+    df, correlations, descriptive_stats = load_data()
+
+    # Criar pasta para gráficos
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    charts_folder = os.path.join(script_dir, '..', 'docs', 'charts')
+
+    generate_charts(df, correlations, descriptive_stats, charts_folder)
     print("\n🎉 Pronto para incluir no relatório!")
 
 
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import math
+import os
+import sqlite3
+import threading
+from glob import glob
+from typing import List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATABASE_FILE = os.path.join(SCRIPT_DIR, "datasets.sqlite")
+
+# Colunas do CSV do coletor e seus tipos no banco
+COLUMNS = [
+    ("number", "INTEGER NOT NULL"),
+    ("title", "TEXT"),
+    ("author", "TEXT"),
+    ("createdAt", "TEXT"),
+    ("closedOrMergedAt", "TEXT"),
+    ("reviewsCount", "INTEGER"),
+    ("hoursOpen", "REAL"),
+    ("merged", "INTEGER"),
+    ("additions", "INTEGER"),
+    ("deletions", "INTEGER"),
+    ("changedFiles", "INTEGER"),
+    ("bodyLength", "INTEGER"),
+    ("issueCommentsCount", "INTEGER"),
+    ("reviewThreadsCount", "INTEGER"),
+    ("interactionsCount", "INTEGER"),
+    ("finalReviewState", "TEXT"),
+    ("nodeId", "TEXT"),
+    ("reviewers", "TEXT"),
+    ("firstResponseHours", "REAL"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+
+class _Median:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        self.values.sort()
+        middle = len(self.values) // 2
+        if len(self.values) % 2:
+            return self.values[middle]
+        return (self.values[middle - 1] + self.values[middle]) / 2
+
+
+class _Stdev:
+    """Desvio padrão amostral (ddof=1, como o pandas), pelo algoritmo de Welford."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+def _converter(name: str):
+    """Conversão de um campo de texto do CSV para o tipo da coluna; vazio vira NULL."""
+    kind = dict(COLUMNS)[name]
+    if name == "merged":
+        return lambda value: None if value == "" else int(value == "True")
+    if kind.startswith("INTEGER"):
+        return lambda value: None if value == "" else int(value)
+    if kind == "REAL":
+        return lambda value: None if value == "" else float(value)
+    if name in ("title", "author"):
+        return str
+    return lambda value: value or None
+
+
+class PRDatabase:
+    """Base SQLite com os PRs de todos os repositórios, um registro por (repository, number), e as agregações `median` e `stdev`."""
+
+    def __init__(self, path: str = DEFAULT_DATABASE_FILE):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # WAL: o analyzer pode consultar a base enquanto o coletor grava
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.create_aggregate("median", 1, _Median)
+        self._conn.create_aggregate("stdev", 1, _Stdev)
+        columns = ",\n".join(f"{name} {kind}" for name, kind in COLUMNS)
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS prs (
+                    repository TEXT NOT NULL,
+                    {columns},
+                    PRIMARY KEY (repository, number)
+                )""")
+            # Filtros combinados por repositório (status e período) usam só o índice
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS prs_repository ON prs (repository, merged, createdAt)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS prs_author ON prs (author)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS prs_created_at ON prs (createdAt)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS prs_merged ON prs (merged)")
+
+    def close(self):
+        self._conn.close()
+
+    def upsert_csv(self, repository: str, csv_path: str) -> int:
+        """Insere ou atualiza os PRs do CSV de `repository` (owner_name); colunas ausentes ficam NULL. Retorna quantas linhas leu."""
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            names = [name for name in COLUMN_NAMES if name in header]
+            fields = [(header.index(name), _converter(name)) for name in names]
+            updates = ", ".join(f"{name} = excluded.{name}" for name in names if name != "number")
+            sql = (f"INSERT INTO prs (repository, {', '.join(names)}) "
+                   f"VALUES ({', '.join('?' * (len(names) + 1))}) "
+                   f"ON CONFLICT (repository, number) DO UPDATE SET {updates}")
+            rows = [[repository] + [convert(row[i]) for i, convert in fields] for row in reader]
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+        return len(rows)
+
+    def repositories(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT repository FROM prs ORDER BY repository")]
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def median(self, column: str, repository: Optional[str] = None, merged: Optional[bool] = None,
+               created_from: Optional[str] = None, created_to: Optional[str] = None):
+        """Mediana de `column` nos PRs filtrados; `created_from`/`created_to` são datas ISO (intervalo fechado-aberto)."""
+        if column not in COLUMN_NAMES:
+            raise ValueError(f"Coluna desconhecida: {column}")
+        conditions, params = [], []
+        if repository is not None:
+            conditions.append("repository = ?")
+            params.append(repository)
+        if merged is not None:
+            conditions.append("merged = ?")
+            params.append(int(merged))
+        if created_from is not None:
+            conditions.append("createdAt >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            conditions.append("createdAt < ?")
+            params.append(created_to)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(f"SELECT median({column}) FROM prs{where}", params)[0][0]
+
+
+def import_csvs(input_folder: str, database: PRDatabase) -> int:
+    """Carrega (upsert) na base todos os CSVs de `input_folder`."""
+    total = 0
+    for csv_file in sorted(glob(os.path.join(input_folder, "*.csv"))):
+        total += database.upsert_csv(os.path.basename(csv_file)[:-len(".csv")], csv_file)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Carrega os CSVs coletados na base SQLite (upsert por repositório e número do PR)")
+    parser.add_argument("--input", default=os.path.join(SCRIPT_DIR, "datasets"),
+                        help="Pasta com os CSVs (padrão: datasets/)")
+    parser.add_argument("--database", default=DEFAULT_DATABASE_FILE,
+                        help="Arquivo da base (padrão: datasets.sqlite)")
+    args = parser.parse_args()
+
+    database = PRDatabase(args.database)
+    rows = import_csvs(args.input, database)
+    print(f"✅ {rows} PRs carregados de {len(database.repositories())} repositórios em {args.database}")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
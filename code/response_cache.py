@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+
+class CacheMiss(Exception):
+    """Consulta sem resposta no cache durante o modo de replay estrito."""
+
+
+class ResponseCache:
+    """Cache em disco das respostas GraphQL, com chave pelo texto da consulta e as variáveis (sem pageSize)."""
+
+    def __init__(self, directory: str, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None, replay: bool = False):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    @staticmethod
+    def key(query: str, variables: dict) -> str:
+        variables = {name: value for name, value in (variables or {}).items()
+                     if name != "pageSize"}
+        payload = json.dumps({"query": query, "variables": variables},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(".json.gz"):
+                    yield os.path.join(root, filename)
+
+    def get(self, query: str, variables: dict) -> Optional[dict]:
+        """Retorna {"data", "elapsed"} da resposta salva, ou None."""
+        path = self._path(self.key(query, variables))
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry["stored_at"] > self.ttl_seconds:
+            self.misses += 1
+            return None
+
+        # Atualiza o horário de acesso para a remoção por LRU
+        os.utime(path, None)
+        self.hits += 1
+        return entry
+
+    def put(self, query: str, variables: dict, data: dict, elapsed: float):
+        path = self._path(self.key(query, variables))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"stored_at": time.time(), "elapsed": elapsed,
+                       "data": data}, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += size
+            if self.max_bytes is not None and self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove entradas pela ordem de último uso até ficar abaixo de 90% do limite."""
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        target = self.max_bytes * 0.9
+        for path in entries:
+            if self._size <= target:
+                break
+            self._size -= os.path.getsize(path)
+            os.remove(path)
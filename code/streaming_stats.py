@@ -0,0 +1,247 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+import dataset_store
+
+# Erro relativo máximo dos quantis (mediana e percentis)
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Valores monitorados por coluna para a moda
+DEFAULT_MODE_CAPACITY = 1024
+# Bytes de CSV lidos por lote
+DEFAULT_BLOCK_SIZE = 4 << 20
+
+
+class QuantileSketch:
+    """Sketch de quantis combinável (DDSketch), com erro relativo de no máximo `relative_accuracy` (mais meia unidade em dados inteiros)."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy deve estar entre 0 e 1: {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        # Com todos os valores inteiros, os quantis são arredondados para o inteiro mais próximo
+        self.integers = True
+
+    def _add(self, buckets: Dict[int, int], magnitudes: np.ndarray):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self._add(self.positive, values[values > 0])
+        self._add(self.negative, -values[values < 0])
+        self.zeros += int(np.count_nonzero(values == 0))
+        self.count += len(values)
+        self.integers = self.integers and bool(np.all(values == np.round(values)))
+
+    def merge(self, other: "QuantileSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Só é possível combinar sketches com a mesma precisão")
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.integers = self.integers and other.integers
+
+    def _value(self, key: int) -> float:
+        value = 2 * self.gamma ** key / (self.gamma + 1)
+        if not self.integers:
+            return value
+        # Inteiro do bucket (gamma^(key-1), gamma^key] mais próximo do representante
+        upper = math.floor(self.gamma ** key)
+        lower = math.floor(self.gamma ** (key - 1)) + 1
+        return float(min(max(round(value), lower), upper))
+
+    def _value_at_rank(self, rank: int) -> float:
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def quantile(self, q: float) -> float:
+        """Quantil `q` (0 a 1) com interpolação linear entre postos, como o numpy/pandas."""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        lower = self._value_at_rank(math.floor(rank))
+        if rank == math.floor(rank):
+            return lower
+        return lower + (self._value_at_rank(math.ceil(rank)) - lower) * (rank - math.floor(rank))
+
+
+class HeavyHitters:
+    """Valores mais frequentes de uma coluna (Space-Saving combinável); a moda é exata quando sua frequência passa de `floor`."""
+
+    def __init__(self, capacity: int = DEFAULT_MODE_CAPACITY):
+        if capacity < 1:
+            raise ValueError(f"capacity deve ser positiva: {capacity}")
+        self.capacity = capacity
+        self.counts: Dict = {}
+        self.floor = 0
+        self.total = 0
+
+    def update(self, values: np.ndarray):
+        keys, counts = np.unique(values, return_counts=True)
+        # Contagem exata do lote, reduzida aos `capacity` valores mais frequentes;
+        # a ordenação estável mantém o menor valor em caso de empate
+        order = np.argsort(-counts, kind="stable")
+        chunk = HeavyHitters(self.capacity)
+        chunk.counts = dict(zip(keys[order[:self.capacity]].tolist(),
+                                counts[order[:self.capacity]].tolist()))
+        chunk.floor = int(counts[order[self.capacity]]) if len(keys) > self.capacity else 0
+        chunk.total = len(values)
+        self.merge(chunk)
+
+    def merge(self, other: "HeavyHitters"):
+        merged = {key: self.counts.get(key, self.floor) + other.counts.get(key, other.floor)
+                  for key in self.counts.keys() | other.counts.keys()}
+        floor = self.floor + other.floor
+        if len(merged) > self.capacity:
+            ranked = sorted(merged.items(), key=lambda item: (-item[1], item[0]))
+            floor = max(floor, ranked[self.capacity][1])
+            merged = dict(ranked[:self.capacity])
+        self.counts, self.floor = merged, floor
+        self.total += other.total
+
+    def mode(self):
+        """Valor mais frequente (o menor, em caso de empate), ou None sem dados."""
+        if not self.counts:
+            return None
+        return min(self.counts.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+class ColumnState:
+    """Estado combinável de uma coluna: contagem, média e variância (Welford/Chan), extremos, quantis e moda."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 mode_capacity: int = DEFAULT_MODE_CAPACITY):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = QuantileSketch(relative_accuracy)
+        self.modes = HeavyHitters(mode_capacity)
+
+    def _combine(self, count: int, mean: float, m2: float, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def update(self, values: np.ndarray):
+        """Incorpora um lote de valores; NaN conta como ausente."""
+        values = np.asarray(values)
+        if values.dtype.kind == "f":
+            values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        mean = values.mean(dtype=np.float64)
+        m2 = ((values - mean) ** 2).sum(dtype=np.float64)
+        self._combine(len(values), float(mean), float(m2), values.min().item(), values.max().item())
+        self.quantiles.update(values)
+        self.modes.update(values)
+
+    def merge(self, other: "ColumnState"):
+        if other.count == 0:
+            return
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.quantiles.merge(other.quantiles)
+        self.modes.merge(other.modes)
+
+    def result(self, percentiles: List[float] = ()) -> dict:
+        """Estatísticas finais; percentis em `percentiles` (0 a 100) viram chaves `p<N>`."""
+        variance = self.m2 / (self.count - 1) if self.count > 1 else math.nan
+        result = {
+            'count': self.count,
+            'mean': self.mean if self.count else math.nan,
+            'median': self.quantiles.quantile(0.5),
+            'mode': self.modes.mode(),
+            'min': self.min,
+            'max': self.max,
+            'variance': variance,
+            'std_dev': math.sqrt(variance)
+        }
+        for percentile in percentiles:
+            result[f'p{percentile:g}'] = self.quantiles.quantile(percentile / 100)
+        return result
+
+
+class StreamingStats:
+    """Estados por (grupo, coluna), na ordem em que aparecem, combináveis entre workers."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 mode_capacity: int = DEFAULT_MODE_CAPACITY):
+        self.relative_accuracy = relative_accuracy
+        self.mode_capacity = mode_capacity
+        self.states: Dict[tuple, ColumnState] = {}
+
+    def state(self, group, column: str) -> ColumnState:
+        key = (group, column)
+        if key not in self.states:
+            self.states[key] = ColumnState(self.relative_accuracy, self.mode_capacity)
+        return self.states[key]
+
+    def update(self, group, column: str, values: np.ndarray):
+        self.state(group, column).update(values)
+
+    def merge(self, other: "StreamingStats"):
+        for (group, column), state in other.states.items():
+            self.state(group, column).merge(state)
+
+
+def iter_csv_batches(csv_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[pa.RecordBatch]:
+    """Lê o CSV em lotes de ~`block_size` bytes, com os tipos de dataset_store.PR_SCHEMA nas colunas do coletor."""
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in dataset_store.PR_SCHEMA})
+    reader = pacsv.open_csv(csv_path, read_options=pacsv.ReadOptions(block_size=block_size),
+                            convert_options=convert_options)
+    yield from reader
+
+
+def numeric_columns(batch: pa.RecordBatch) -> Iterator[tuple]:
+    """Pares (nome, valores em float64/inteiro numpy) das colunas numéricas do lote; nulos viram NaN."""
+    for name, column in zip(batch.schema.names, batch.columns):
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            yield name, column.to_numpy(zero_copy_only=False)
+
+
+def collect(csv_files: List[str], update: Callable[[StreamingStats, str, pa.RecordBatch], None],
+            relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+            mode_capacity: int = DEFAULT_MODE_CAPACITY, block_size: int = DEFAULT_BLOCK_SIZE,
+            workers: Optional[int] = None) -> List[StreamingStats]:
+    """Processa cada CSV lote a lote com `update(stats, csv_file, batch)` em `workers` threads; devolve um estado por arquivo."""
+    def process(csv_file):
+        stats = StreamingStats(relative_accuracy, mode_capacity)
+        for batch in iter_csv_batches(csv_file, block_size):
+            update(stats, csv_file, batch)
+        return stats
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(process, csv_files))
@@ -0,0 +1,388 @@
+import argparse
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from response_cache import ResponseCache
+
+BASE_DATE = datetime.datetime(2016, 1, 1, tzinfo=datetime.timezone.utc)
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _timestamp(value: datetime.datetime) -> str:
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+
+class SyntheticGitHub:
+    """Gera repositórios `stub/repo-N` e PRs determinísticos (semente derivada do nome) no formato da API GraphQL."""
+
+    def __init__(self, repos: int = 20, prs_per_repo: int = 500, body_size: int = 400, seed: int = 42):
+        self.repos = repos
+        self.prs_per_repo = prs_per_repo
+        self.body_size = body_size
+        self.seed = seed
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def repo_names(self) -> List[tuple]:
+        return [("stub", f"repo-{i}") for i in range(self.repos)]
+
+    def pull_requests(self, owner: str, name: str) -> List[dict]:
+        """PRs do repositório, do mais antigo para o mais novo."""
+        key = f"{owner}/{name}"
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = self._generate(key)
+            return self._cache[key]
+
+    def _generate(self, key: str) -> List[dict]:
+        rng = random.Random(zlib.crc32(key.encode("utf-8")) ^ self.seed)
+        prs = []
+        for number in range(1, self.prs_per_repo + 1):
+            created = BASE_DATE + datetime.timedelta(hours=6 * number)
+            closed = created + datetime.timedelta(minutes=rng.randint(5, 60 * 24 * 30))
+            updated = closed + datetime.timedelta(hours=rng.randint(0, 48))
+            merged = rng.random() < 0.7
+            prs.append({
+                "id": f"PR_{key}#{number}",
+                "number": number,
+                "title": f"Synthetic PR {number} of {key}",
+                "author": {"login": f"user{rng.randint(1, 50)}"},
+                "createdAt": _timestamp(created),
+                "updatedAt": _timestamp(updated),
+                "closedAt": _timestamp(closed),
+                "mergedAt": _timestamp(closed) if merged else None,
+                "merged": merged,
+                "additions": rng.randint(0, 2000),
+                "deletions": rng.randint(0, 1000),
+                "changedFiles": rng.randint(1, 40),
+                "bodyText": "x" * rng.randint(0, 2 * self.body_size),
+                "comments": {"totalCount": rng.randint(0, 20)},
+                "reviewThreads": {"totalCount": rng.randint(0, 10)},
+                "participants": {"totalCount": rng.randint(1, 8)},
+                "reviews": {"totalCount": rng.choice([0, 0, 1, 1, 2, 3, 5])},
+                "state": "MERGED" if merged else "CLOSED",
+            })
+        return prs
+
+    def repository_search_page(self, after: Optional[str], page_size: int = 20,
+                               search: str = "stars:>10000 sort:stars-desc") -> dict:
+        """Emula `search(type: REPOSITORY)` com os qualificadores `stars:>N`, `stars:>=N` e `stars:A..B`."""
+        stars = re.search(r"stars:(>=?)?(\d+)(?:\.\.(\d+))?", search)
+        low, high = 0, float("inf")
+        if stars and stars.group(3):
+            low, high = int(stars.group(2)), int(stars.group(3))
+        elif stars:
+            low = int(stars.group(2)) + (1 if stars.group(1) == ">" else 0)
+
+        nodes = [{
+            "name": name,
+            "owner": {"login": owner},
+            "primaryLanguage": {"name": "Python"},
+            "stargazerCount": 100000 - i,
+            "forkCount": 1000,
+            "releases": {"totalCount": 10},
+            "pullRequests": {"totalCount": self.prs_per_repo},
+        } for i, (owner, name) in enumerate(self.repo_names())]
+        matches = [node for node in nodes if low <= node["stargazerCount"] <= high]
+        visible = matches[:1000]
+
+        offset = int(after or 0)
+        return {"search": {
+            "repositoryCount": len(matches),
+            "edges": [{"node": node} for node in visible[offset:offset + page_size]],
+            "pageInfo": {"hasNextPage": offset + page_size < len(visible),
+                         "endCursor": str(offset + page_size)},
+        }}
+
+    def pull_request_page(self, owner: str, name: str, after: Optional[str], page_size: int,
+                          field: str = "CREATED_AT", direction: str = "DESC") -> dict:
+        prs = self.pull_requests(owner, name)
+        if field == "UPDATED_AT":
+            prs = sorted(prs, key=lambda pr: pr["updatedAt"])
+        if direction == "DESC":
+            prs = prs[::-1]
+        offset = int(after or 0)
+        return {
+            "totalCount": len(prs),
+            "pageInfo": {"hasNextPage": offset + page_size < len(prs),
+                         "endCursor": str(offset + page_size)},
+            "nodes": prs[offset:offset + page_size],
+        }
+
+    def pull_request_details(self, node_id: str) -> Optional[dict]:
+        """Emula o resultado de `nodes(ids:)` para a consulta PullRequestDetails."""
+        match = re.fullmatch(r"PR_(.+)/(.+)#(\d+)", node_id)
+        if not match:
+            return None
+        prs = self.pull_requests(match.group(1), match.group(2))
+        number = int(match.group(3))
+        if not 1 <= number <= len(prs):
+            return None
+        pr = prs[number - 1]
+
+        rng = random.Random(zlib.crc32(node_id.encode("utf-8")) ^ self.seed)
+        created = _parse_timestamp(pr["createdAt"])
+        reviews = [{
+            "author": {"login": f"user{rng.randint(1, 50)}"},
+            "submittedAt": _timestamp(created + datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 5))),
+            "state": rng.choice(["APPROVED", "CHANGES_REQUESTED", "COMMENTED"]),
+        } for _ in range(pr["reviews"]["totalCount"])]
+        reviews.sort(key=lambda review: review["submittedAt"])
+        comments = [{
+            "author": {"login": rng.choice([pr["author"]["login"], f"user{rng.randint(1, 50)}"])},
+            "createdAt": _timestamp(created + datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 5))),
+        } for _ in range(min(pr["comments"]["totalCount"], 10))]
+        comments.sort(key=lambda comment: comment["createdAt"])
+        return {
+            "id": node_id,
+            "createdAt": pr["createdAt"],
+            "author": pr["author"],
+            "lastReview": {"nodes": [{key: review[key] for key in ("state", "submittedAt")}
+                                     for review in reviews[-1:]]},
+            "reviews": {"nodes": [{key: review[key] for key in ("author", "submittedAt")}
+                                  for review in reviews]},
+            "comments": {"nodes": comments},
+        }
+
+    def search_pull_requests(self, search: str, after: Optional[str], page_size: int) -> dict:
+        """Emula `search(type: ISSUE)` para `repo:X is:pr is:closed -review:none created:A..B`."""
+        repo = re.search(r"repo:(\S+)/(\S+)", search)
+        created = re.search(r"created:(\S+)\.\.(\S+)", search)
+        start, end = _parse_timestamp(created.group(1)), _parse_timestamp(created.group(2))
+        matches = [pr for pr in reversed(self.pull_requests(repo.group(1), repo.group(2)))
+                   if pr["reviews"]["totalCount"] > 0
+                   and start <= _parse_timestamp(pr["createdAt"]) <= end]
+        visible = matches[:1000]
+        offset = int(after or 0)
+        return {"search": {
+            "issueCount": len(matches),
+            "pageInfo": {"hasNextPage": offset + page_size < len(visible),
+                         "endCursor": str(offset + page_size)},
+            "nodes": visible[offset:offset + page_size],
+        }}
+
+
+class StubState:
+    """Configuração de falhas e contadores compartilhados entre as threads do servidor."""
+
+    def __init__(self, github: SyntheticGitHub, latency: float = 0.0, latency_per_node: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1,
+                 budget: int = 1_000_000, recorded: Optional[ResponseCache] = None, seed: int = 42):
+        self.github = github
+        self.latency = latency
+        self.latency_per_node = latency_per_node
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.budget = budget
+        self.recorded = recorded
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # Orçamento separado por token (cabeçalho Authorization), como na API real
+        self.remaining = {}
+        self.reset_at = time.time() + 3600
+        self.stats = {"requests": 0, "ok": 0, "errors_502": 0, "throttled_429": 0, "nodes": 0}
+
+    def rate_limit(self, token: str = "") -> dict:
+        with self.lock:
+            if time.time() >= self.reset_at:
+                self.remaining = {}
+                self.reset_at = time.time() + 3600
+            self.remaining[token] = max(self.remaining.get(token, self.budget) - 1, 0)
+            return {"cost": 1, "remaining": self.remaining[token],
+                    "resetAt": _timestamp(datetime.datetime.fromtimestamp(self.reset_at, datetime.timezone.utc))}
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.rng.random() < rate
+
+
+def _page_size(query: str, variables: dict, default: int = 50) -> int:
+    if "pageSize" in variables:
+        return int(variables["pageSize"])
+    match = re.search(r"first:\s*(\d+)", query)
+    return int(match.group(1)) if match else default
+
+
+def answer(state: StubState, query: str, variables: dict, token: str = "") -> dict:
+    """Monta o campo `data` da resposta conforme o formato da consulta recebida."""
+    github = state.github
+    if state.recorded is not None:
+        entry = state.recorded.get(query, variables)
+        if entry is None:
+            return {"errors": [{"message": "Consulta não gravada", "type": "NOT_FOUND"}]}
+        return entry["data"]
+
+    if "PullRequestDetails" in query:
+        data = {"nodes": [github.pull_request_details(node_id) for node_id in variables["ids"]]}
+    elif "FirstPullRequestPages" in query:
+        data = {}
+        size = _page_size(query, {})
+        for alias in re.findall(r"(repo\d+): repository", query):
+            i = alias[len("repo"):]
+            data[alias] = {"pullRequests": github.pull_request_page(
+                variables[f"owner{i}"], variables[f"name{i}"], None, size)}
+    elif "type: REPOSITORY" in query:
+        search = variables.get("q") or re.search(r'query:\s*"([^"]*)"', query).group(1)
+        data = github.repository_search_page(
+            variables.get("after"), _page_size(query, variables), search)
+    elif "type: ISSUE" in query:
+        result = github.search_pull_requests(
+            variables["q"], variables.get("after"), _page_size(query, variables))
+        if "nodes" not in query:
+            result = {"search": {"issueCount": result["search"]["issueCount"]}}
+        data = result
+    elif "repository(" in query and "nodes" not in query:
+        prs = github.pull_requests(variables["owner"], variables["name"])
+        data = {"repository": {"pullRequests": {"totalCount": len(prs)}}}
+    else:
+        data = {"repository": {"pullRequests": github.pull_request_page(
+            variables["owner"], variables["name"], variables.get("after"),
+            _page_size(query, variables), variables.get("field", "CREATED_AT"),
+            variables.get("direction", "DESC"))}}
+
+    data["rateLimit"] = state.rate_limit(token)
+    return {"data": data}
+
+
+def _count_nodes(data) -> int:
+    if isinstance(data, dict):
+        return len(data.get("nodes") or []) + sum(_count_nodes(value) for value in data.values())
+    return 0
+
+
+def make_handler(state: StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    body = json.dumps(state.stats).encode("utf-8")
+                self._send(200, body, "application/json")
+            else:
+                self._send(404, b"", "text/plain")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            state.count("requests")
+
+            if state.roll(state.throttle_rate):
+                state.count("throttled_429")
+                self._send(429, b'{"message": "You have exceeded a secondary rate limit."}',
+                           "application/json", {"Retry-After": str(state.retry_after)})
+                return
+            if state.roll(state.error_rate):
+                state.count("errors_502")
+                time.sleep(state.latency)
+                self._send(502, b"<html><head><title>502 Bad Gateway</title></head></html>",
+                           "text/html")
+                return
+
+            token = self.headers.get("Authorization", "")
+            with state.lock:
+                exhausted = state.remaining.get(token, state.budget) <= 0 and time.time() < state.reset_at
+            if exhausted:
+                state.count("throttled_429")
+                self._send(200, json.dumps({"data": None, "errors": [
+                    {"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}).encode("utf-8"),
+                    "application/json", {"x-ratelimit-remaining": "0",
+                                         "x-ratelimit-reset": str(int(state.reset_at))})
+                return
+
+            result = answer(state, payload.get("query", ""), payload.get("variables") or {}, token)
+            nodes = _count_nodes(result.get("data"))
+            state.count("nodes", nodes)
+            time.sleep(state.latency + state.latency_per_node * nodes)
+
+            rate_limit = (result.get("data") or {}).get("rateLimit") or {}
+            headers = {}
+            if rate_limit:
+                headers = {
+                    "x-ratelimit-limit": str(state.budget),
+                    "x-ratelimit-remaining": str(rate_limit["remaining"]),
+                    "x-ratelimit-reset": str(int(state.reset_at)),
+                }
+            state.count("ok")
+            self._send(200, json.dumps(result).encode("utf-8"), "application/json", headers)
+
+    return StubHandler
+
+
+def create_server(state: StubState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Cria o servidor (porta 0 = porta livre escolhida pelo sistema)."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Servidor GraphQL local que imita a API do GitHub para testes do coletor")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--repos", type=int, default=20,
+                        help="Quantidade de repositórios sintéticos")
+    parser.add_argument("--prs-per-repo", type=int, default=500)
+    parser.add_argument("--body-size", type=int, default=400,
+                        help="Tamanho médio do bodyText sintético (caracteres)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Latência fixa por requisição (s)")
+    parser.add_argument("--latency-per-node", type=float, default=0.0,
+                        help="Latência adicional por nó de PR devolvido (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fração de requisições respondidas com 502")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Fração de requisições respondidas com 429")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Valor do cabeçalho Retry-After nas respostas 429 (s)")
+    parser.add_argument("--budget", type=int, default=1_000_000,
+                        help="Pontos de rate limit por janela de uma hora")
+    parser.add_argument("--recorded",
+                        help="Diretório de um cache de respostas (--cache do coletor) a ser servido")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    state = StubState(
+        SyntheticGitHub(args.repos, args.prs_per_repo, args.body_size, args.seed),
+        latency=args.latency, latency_per_node=args.latency_per_node,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, budget=args.budget,
+        recorded=ResponseCache(args.recorded) if args.recorded else None,
+        seed=args.seed,
+    )
+    server = create_server(state, port=args.port)
+    print(f"🧪 Servidor GraphQL local em http://127.0.0.1:{server.server_port}/graphql")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,107 @@
+import argparse
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 
+import streaming_stats
+
 OUTPUT_DIR = 'results'
 
 
-def summarize_csvs(input_folder, output_file):
+def _column_statistics(values):
+    """Calcula todas as estatísticas de uma coluna numérica sem ausentes, com os mesmos valores do pandas"""
+    count = len(values)
+    floats = values if values.dtype.kind == 'f' else values.astype('f8')
+    total = values.sum(dtype=np.float64)
+    mean = total / count
+    if count > 1:
+        variance = ((total / count - floats) ** 2).sum(dtype=np.float64) / (count - 1)
+    else:
+        variance = np.nan
+
+    ordered = np.sort(values)
+    middle = count // 2
+    if count % 2:
+        median = float(ordered[middle])
+    else:
+        median = (float(ordered[middle - 1]) + float(ordered[middle])) / 2
+    # Início de cada sequência de valores iguais; entre valores igualmente
+    # frequentes fica o menor, como em Series.mode().iloc[0]
+    starts = np.concatenate(([0], np.flatnonzero(ordered[1:] != ordered[:-1]) + 1))
+    frequencies = np.diff(np.append(starts, count))
+    return {
+        'count': count,
+        'mean': mean,
+        'median': median,
+        'mode': ordered[starts[frequencies.argmax()]],
+        'min': ordered[0],
+        'max': ordered[-1],
+        'variance': variance,
+        'std_dev': np.sqrt(variance)
+    }
+
+
+def _summarize_file(csv_file):
+    """Lê um CSV com o parser do pyarrow e resume cada coluna numérica"""
+    table = pacsv.read_csv(csv_file)
+    rows = []
+    for name, column in zip(table.column_names, table.columns):
+        if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+            continue
+        if column.null_count:
+            column = pc.drop_null(column).cast(pa.float64())
+        if len(column) == 0:
+            continue
+        rows.append({'file': os.path.basename(csv_file), 'column': name,
+                     **_column_statistics(column.to_numpy())})
+    return rows
+
+
+def summarize_csvs(input_folder, output_file, workers=None):
+    """Resume as colunas numéricas de cada CSV, lendo os arquivos em paralelo"""
+    csv_files = glob(os.path.join(input_folder, '*.csv'))
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        summary_rows = [row for rows in executor.map(_summarize_file, csv_files) for row in rows]
+    summary_df = pd.DataFrame(summary_rows)
+    summary_df.to_csv(output_file, index=False)
+
+
+def summarize_csvs_streaming(input_folder, output_file, percentiles=(),
+                             relative_accuracy=streaming_stats.DEFAULT_RELATIVE_ACCURACY,
+                             mode_capacity=streaming_stats.DEFAULT_MODE_CAPACITY,
+                             block_size=streaming_stats.DEFAULT_BLOCK_SIZE, workers=None):
+    """Versão de summarize_csvs que lê os CSVs em lotes; mediana e `percentiles` têm erro relativo de até `relative_accuracy`"""
+    def update(stats, csv_file, batch):
+        for name, values in streaming_stats.numeric_columns(batch):
+            stats.update(os.path.basename(csv_file), name, values)
+
     csv_files = glob(os.path.join(input_folder, '*.csv'))
     summary_rows = []
-    for csv_file in csv_files:
-        df = pd.read_csv(csv_file)
-        for col in df.select_dtypes(include='number').columns:
-            data = df[col].dropna()
-            if len(data) == 0:
-                continue
-            row = {
-                'file': os.path.basename(csv_file),
-                'column': col,
-                'count': len(data),
-                'mean': data.mean(),
-                'median': data.median(),
-                'mode': data.mode().iloc[0] if not data.mode().empty else None,
-                'min': data.min(),
-                'max': data.max(),
-                'variance': data.var(),
-                'std_dev': data.std()
-            }
-            summary_rows.append(row)
+    for stats in streaming_stats.collect(csv_files, update, relative_accuracy, mode_capacity,
+                                         block_size, workers):
+        for (file, column), state in stats.states.items():
+            if state.count:
+                summary_rows.append({'file': file, 'column': column, **state.result(percentiles)})
     summary_df = pd.DataFrame(summary_rows)
     summary_df.to_csv(output_file, index=False)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resume as colunas numéricas de cada CSV coletado")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lê os CSVs em lotes, com mediana e moda aproximadas por sketches")
+    parser.add_argument("--accuracy", type=float, default=streaming_stats.DEFAULT_RELATIVE_ACCURACY,
+                        help="Erro relativo máximo da mediana no modo --streaming (padrão: 0.01)")
+    args = parser.parse_args()
+
     input_folder = os.path.join(os.path.dirname(__file__), 'datasets')
     output_file = os.path.join(OUTPUT_DIR, 'summary.csv')
-    summarize_csvs(input_folder, output_file)
+    if args.streaming:
+        summarize_csvs_streaming(input_folder, output_file, relative_accuracy=args.accuracy)
+    else:
+        summarize_csvs(input_folder, output_file)
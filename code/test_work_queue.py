@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import time
+
+import collector
+from work_queue import WorkQueue
+
+REPO_NODES = [{"owner": {"login": "octo"}, "name": name} for name in ("first", "second")]
+
+
+def test_surviving_worker_takes_over_crashed_worker_job(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "repos.sqlite")
+    queue = WorkQueue(queue_path, lease_seconds=1)
+    queue.enqueue(REPO_NODES)
+
+    # Worker A pega o primeiro repositório e morre no meio da coleta
+    crashed = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, time; from work_queue import WorkQueue; "
+         "WorkQueue(sys.argv[1], lease_seconds=1).claim('A'); print('claimed', flush=True); "
+         "time.sleep(60)", queue_path],
+        cwd=collector.SCRIPT_DIR, stdout=subprocess.PIPE, text=True)
+    assert crashed.stdout.readline().strip() == "claimed"
+    crashed.kill()
+    crashed.wait()
+
+    collected = []
+
+    def fake_collect(owner, name, repo_node, prs_query_text, max_prs=None):
+        collected.append(f"{owner}/{name}")
+        return 1
+
+    monkeypatch.setattr(collector, "collect_repo_prs", fake_collect)
+    monkeypatch.setattr(collector, "_list_processed_repos", lambda: set())
+    monkeypatch.setattr(collector, "QUEUE_POLL_SECONDS", 0.2)
+
+    started = time.monotonic()
+    prs = collector.run_queue_worker(queue_path, max_prs=None, lease_seconds=1)
+
+    assert collected == ["octo/second", "octo/first"]
+    assert prs == 2
+    assert queue.counts() == {"pending": 0, "running": 0, "done": 2, "failed": 0}
+    assert time.monotonic() - started < 10
+    queue.close()
+
+
+def test_next_lease_expiry(tmp_path):
+    queue = WorkQueue(str(tmp_path / "repos.sqlite"), lease_seconds=5)
+    assert queue.next_lease_expiry() is None
+
+    queue.enqueue(REPO_NODES[:1])
+    assert queue.next_lease_expiry() <= time.time()
+
+    queue.claim("A")
+    assert time.time() < queue.next_lease_expiry() <= time.time() + 5
+
+    queue.complete("octo/first", "A", 0)
+    assert queue.next_lease_expiry() is None
+    queue.close()
+
+
+def test_worker_abandons_repository_when_lease_is_lost(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "repos.sqlite")
+    queue = WorkQueue(queue_path, lease_seconds=1)
+    queue.enqueue(REPO_NODES[:1])
+    written, posted = [], []
+
+    def fake_collect(owner, name, repo_node, prs_query_text, max_prs=None):
+        # Outro worker assume a concessão e conclui o repositório enquanto esta coleta continua
+        queue._conn.execute("UPDATE jobs SET worker = 'B' WHERE repository = 'octo/first'")
+        queue.complete("octo/first", "B", 7)
+        collector.LEASE_LOST.wait(5)
+        collector.run_query("query { viewer { login } }", {}, max_retries=1)
+        written.append(f"{owner}/{name}")
+        return 1
+
+    def post(*args, **kwargs):
+        posted.append(kwargs["json"])
+        raise ConnectionError("sem rede nos testes")
+
+    monkeypatch.setattr(collector, "collect_repo_prs", fake_collect)
+    monkeypatch.setattr(collector, "_list_processed_repos", lambda: set())
+    monkeypatch.setattr(collector, "QUEUE_POLL_SECONDS", 0.2)
+    monkeypatch.setattr(collector.SESSION, "post", post)
+
+    prs = collector.run_queue_worker(queue_path, max_prs=None, lease_seconds=1)
+
+    assert written == posted == []
+    assert prs == 0
+    assert queue.counts() == {"pending": 0, "running": 0, "done": 1, "failed": 0}
+    queue.close()
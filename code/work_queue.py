@@ -0,0 +1,130 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+
+class WorkQueue:
+    """Fila de repositórios com concessões (leases) em um arquivo SQLite, compartilhada entre processos."""
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # A conexão é compartilhada com a thread que renova a concessão
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                repository TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                node TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                prs INTEGER,
+                error TEXT,
+                updated_at REAL
+            )""")
+
+    def close(self):
+        self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, repo_nodes: List[dict]) -> int:
+        """Adiciona os repositórios na ordem recebida; os que já estão na fila são mantidos."""
+        added = 0
+        with self._transaction() as conn:
+            position = conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM jobs").fetchone()[0]
+            for repo_node in repo_nodes:
+                repository = f"{repo_node['owner']['login']}/{repo_node['name']}"
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (repository, position, node, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (repository, position, json.dumps(repo_node), time.time()))
+                if cursor.rowcount:
+                    position += 1
+                    added += 1
+        return added
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Reserva o próximo repositório pendente ou com concessão vencida; retorna seu nó ou None."""
+        with self._transaction() as conn:
+            now = time.time()
+            row = conn.execute(
+                "SELECT repository, node FROM jobs "
+                "WHERE (status = 'pending' OR (status = 'running' AND lease_expires < ?)) "
+                "AND attempts < ? ORDER BY position LIMIT 1",
+                (now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE repository = ?",
+                (worker, now + self.lease_seconds, now, row[0]))
+        return json.loads(row[1])
+
+    def next_lease_expiry(self) -> Optional[float]:
+        """Momento (em `time.time()`) em que pode surgir trabalho para `claim`, ou None se a fila acabou."""
+        with self._lock:
+            pending, expiry = self._conn.execute(
+                "SELECT SUM(status = 'pending'), "
+                "MIN(CASE WHEN status = 'running' THEN lease_expires END) "
+                "FROM jobs WHERE attempts < ?", (self.max_attempts,)).fetchone()
+        return time.time() if pending else expiry
+
+    def renew(self, repository: str, worker: str) -> bool:
+        """Estende a concessão; retorna False se ela já passou para outro worker."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE repository = ? AND worker = ? AND status = 'running'",
+                (now + self.lease_seconds, now, repository, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, repository: str, worker: str, prs: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', prs = ?, lease_expires = NULL, error = NULL, "
+                "updated_at = ? WHERE repository = ? AND worker = ?",
+                (prs, time.time(), repository, worker))
+
+    def fail(self, repository: str, worker: str, error: str):
+        """Devolve o repositório à fila, ou o marca como `failed` após `max_attempts`."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE repository = ? AND worker = ?",
+                (self.max_attempts, error, time.time(), repository, worker))
+
+    def counts(self) -> dict:
+        """Quantidade de repositórios por status; concessões vencidas contam como `pending` (ou `failed`)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN status = 'running' AND lease_expires < ? "
+                "THEN CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "ELSE status END, COUNT(*) FROM jobs GROUP BY 1",
+                (time.time(), self.max_attempts)).fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts